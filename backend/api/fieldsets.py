@@ -0,0 +1,29 @@
+from rest_framework.permissions import SAFE_METHODS
+
+RECIPE_EXPANDABLE = ('author', 'tags', 'ingredients')
+
+
+def requested_names(request, param):
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldset:
+
+    def __init__(self, request, fields, expandable=()):
+        only = requested_names(request, 'fields')
+        expand = requested_names(request, 'expand')
+        self.fields = [field for field in fields
+                       if only is None or field in only] or list(fields)
+        self.expanded = {field for field in expandable
+                         if expand is None or field in expand}
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def is_expanded(self, field):
+        return field in self.expanded
@@ -1,29 +1,62 @@
+from django import forms
 from django.contrib.auth import get_user_model
+from django.db.models import F
 from django_filters import rest_framework as filters
 from rest_framework.filters import SearchFilter
 
+from recipes import tag_index
 from recipes.models import Recipe, Tag
 
 User = get_user_model()
 
+RANKINGS = {
+    'popular': 'popularity',
+    'trending': 'trending',
+}
+
+
+class TagSlugField(forms.MultipleChoiceField):
+
+    def valid_value(self, value):
+        return tag_index.tag_id(value) is not None
+
+
+class TagSlugFilter(filters.MultipleChoiceFilter):
+    field_class = TagSlugField
+
 
 class RecipeFilter(filters.FilterSet):
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
-    )
+    author = filters.ModelChoiceFilter(queryset=User.objects.all(),
+                                       method='filter_author')
+    tags = TagSlugFilter(method='filter_tags')
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=[(ranking, ranking) for ranking in RANKINGS],
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
+
+    def filter_author(self, queryset, name, value):
+        if self.data.get('ordering') in RANKINGS:
+            return queryset.filter(score__author=value)
+        return queryset.filter(author=value)
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = {tag_index.tag_id(slug) for slug in value} - {None}
+        mask = Tag.mask_for(tag_ids)
+        if not tag_ids or any(not Tag.bit_for(tag_id) for tag_id in tag_ids):
+            return queryset.filter(tags__in=tag_ids).distinct()
+        return queryset.alias(
+            tag_bits=F('tag_mask').bitand(mask)).filter(tag_bits__gt=0)
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -37,6 +70,10 @@ class RecipeFilter(filters.FilterSet):
             return queryset.filter(in_shoppingcart__user=user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        return queryset.filter(score__isnull=False).order_by(
+            f'-score__{RANKINGS[value]}', '-id')
+
 
 class IngredientFilter(SearchFilter):
     search_param = 'name'
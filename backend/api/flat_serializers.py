@@ -0,0 +1,229 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from recipes.models import (Favorite, IngredientInRecipe, Recipe,
+                            ShoppingCart, User)
+from .fieldsets import RECIPE_EXPANDABLE, SparseFieldset
+from .lookups import followed_author_ids
+from .serializers import (IngredientSerializer, RecipeIngredientSerializer,
+                          RecipeListSerializer, RecipeSerializer,
+                          SubscriptionSerializer, TagSerializer,
+                          UserSerializer)
+
+RECIPE_FIELDS = RecipeSerializer.Meta.fields
+USER_FIELDS = UserSerializer.Meta.fields
+TAG_FIELDS = TagSerializer.Meta.fields
+RECIPE_INGREDIENT_FIELDS = RecipeIngredientSerializer.Meta.fields
+INGREDIENT_FIELDS = IngredientSerializer.Meta.fields
+SUBSCRIPTION_FIELDS = SubscriptionSerializer.Meta.fields
+SHORT_RECIPE_FIELDS = RecipeListSerializer.Meta.fields
+
+RECIPE_COLUMNS = ('id', 'name', 'image', 'text', 'cooking_time')
+USER_COLUMNS = [field for field in USER_FIELDS if field != 'is_subscribed']
+AUTHOR_COLUMNS = [f'author__{field}' for field in USER_COLUMNS]
+TAG_COLUMNS = tuple(f'tag__{field}' for field in TAG_FIELDS)
+RECIPE_INGREDIENT_COLUMNS = dict(zip(
+    RECIPE_INGREDIENT_FIELDS,
+    ('ingredient_id', 'ingredient__name', 'ingredient__measurement_unit',
+     'amount')
+))
+COLLAPSED_INGREDIENT_COLUMNS = {'id': 'ingredient_id', 'amount': 'amount'}
+SUBSCRIPTION_COLUMNS = tuple(
+    f'author__{field}' for field in SUBSCRIPTION_FIELDS
+    if field not in ('is_subscribed', 'recipes', 'recipes_count'))
+
+RECIPE_IMAGE_STORAGE = Recipe._meta.get_field('image').storage
+AVATAR_STORAGE = User._meta.get_field('avatar').storage
+
+
+def absolute_media_url(request, storage, name):
+    if not name:
+        return None
+    if request is None:
+        return storage.url(name)
+    return request.build_absolute_uri(storage.url(name))
+
+
+class FlatSerializer:
+
+    def __init__(self, context):
+        self.request = context['request']
+        self.user = getattr(self.request, 'user', AnonymousUser())
+
+    def related_ids(self, model, field, ids):
+        if not self.user.is_authenticated:
+            return set()
+        return set(model.objects.filter(
+            user=self.user, **{f'{field}__in': ids}
+        ).values_list(field, flat=True))
+
+
+class IngredientFlatSerializer(FlatSerializer):
+
+    def project(self, queryset):
+        return queryset.values_list(*INGREDIENT_FIELDS)
+
+    def serialize(self, rows):
+        return [dict(zip(INGREDIENT_FIELDS, row)) for row in rows]
+
+
+class RecipeFlatSerializer(FlatSerializer):
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.fieldset = SparseFieldset(
+            self.request, RECIPE_FIELDS, RECIPE_EXPANDABLE)
+
+    def project(self, queryset):
+        columns = ['id']
+        for field in self.fieldset.fields:
+            if field in RECIPE_COLUMNS:
+                columns.append(field)
+            elif field == 'author' and self.fieldset.is_expanded(field):
+                columns += AUTHOR_COLUMNS
+            elif field == 'author':
+                columns.append('author')
+        return queryset.values(*dict.fromkeys(columns))
+
+    def tags(self, recipe_ids):
+        tags = defaultdict(list)
+        if self.fieldset.is_expanded('tags'):
+            for recipe_id, *values in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', *TAG_COLUMNS).order_by('id'):
+                tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+        else:
+            for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('recipe_id', 'tag_id').order_by('id'):
+                tags[recipe_id].append(tag_id)
+        return tags
+
+    def ingredients(self, recipe_ids):
+        ingredients = defaultdict(list)
+        columns = (RECIPE_INGREDIENT_COLUMNS
+                   if self.fieldset.is_expanded('ingredients')
+                   else COLLAPSED_INGREDIENT_COLUMNS)
+        for recipe_id, *values in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', *columns.values()).order_by('id'):
+            ingredients[recipe_id].append(dict(zip(columns, values)))
+        return ingredients
+
+    def serialize(self, rows):
+        rows = list(rows)
+        fields = self.fieldset.fields
+        recipe_ids = [row['id'] for row in rows]
+        related = {}
+        if 'tags' in fields:
+            related['tags'] = self.tags(recipe_ids)
+        if 'ingredients' in fields:
+            related['ingredients'] = self.ingredients(recipe_ids)
+        if 'is_favorited' in fields:
+            related['is_favorited'] = self.related_ids(
+                Favorite, 'recipe', recipe_ids)
+        if 'is_in_shopping_cart' in fields:
+            related['is_in_shopping_cart'] = self.related_ids(
+                ShoppingCart, 'recipe', recipe_ids)
+        expand_author = self.fieldset.is_expanded('author')
+        if 'author' in fields and expand_author:
+            subscribed = followed_author_ids(self.request)
+        result = []
+        for row in rows:
+            recipe_id = row['id']
+            item = {}
+            for field in fields:
+                if field in ('tags', 'ingredients'):
+                    item[field] = related[field][recipe_id]
+                elif field in ('is_favorited', 'is_in_shopping_cart'):
+                    item[field] = recipe_id in related[field]
+                elif field == 'author' and expand_author:
+                    item[field] = self.author(row, subscribed)
+                elif field == 'image':
+                    item[field] = absolute_media_url(
+                        self.request, RECIPE_IMAGE_STORAGE, row['image'])
+                else:
+                    item[field] = row[field]
+            result.append(item)
+        return result
+
+    def author(self, row, subscribed):
+        author = {}
+        for field in USER_FIELDS:
+            if field == 'is_subscribed':
+                author[field] = row['author__id'] in subscribed
+            elif field == 'avatar':
+                author[field] = absolute_media_url(
+                    self.request, AVATAR_STORAGE, row['author__avatar'])
+            else:
+                author[field] = row[f'author__{field}']
+        return author
+
+
+class SubscriptionFlatSerializer(FlatSerializer):
+
+    def __init__(self, context):
+        super().__init__(context)
+        self.fieldset = SparseFieldset(self.request, SUBSCRIPTION_FIELDS)
+
+    def project(self, queryset):
+        return queryset.values(*SUBSCRIPTION_COLUMNS)
+
+    def recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if not recipes_limit:
+            return None
+        try:
+            return int(recipes_limit)
+        except ValueError:
+            return 0
+
+    def recipes(self, author_ids):
+        recipes = defaultdict(list)
+        limit = self.recipes_limit()
+        queryset = Recipe.objects.filter(author_id__in=author_ids)
+        if limit is not None:
+            queryset = queryset.annotate(row_number=Window(
+                RowNumber(), partition_by=F('author_id'),
+                order_by=F('id').desc()
+            )).filter(row_number__lte=limit)
+        for row in queryset.values('author_id', *SHORT_RECIPE_FIELDS):
+            author_id = row.pop('author_id')
+            row['image'] = absolute_media_url(
+                self.request, RECIPE_IMAGE_STORAGE, row['image'])
+            recipes[author_id].append(row)
+        return recipes
+
+    def serialize(self, rows):
+        rows = list(rows)
+        fields = self.fieldset.fields
+        author_ids = [row['author__id'] for row in rows]
+        related = {}
+        if 'is_subscribed' in fields:
+            related['is_subscribed'] = followed_author_ids(self.request)
+        if 'recipes' in fields:
+            related['recipes'] = self.recipes(author_ids)
+        if 'recipes_count' in fields:
+            related['recipes_count'] = defaultdict(int, Recipe.objects.filter(
+                author_id__in=author_ids
+            ).values_list('author_id').annotate(
+                total=Count('id')).order_by())
+        result = []
+        for row in rows:
+            author_id = row['author__id']
+            item = {}
+            for field in fields:
+                if field == 'is_subscribed':
+                    item[field] = author_id in related[field]
+                elif field in ('recipes', 'recipes_count'):
+                    item[field] = related[field][author_id]
+                elif field == 'avatar':
+                    item[field] = absolute_media_url(
+                        self.request, AVATAR_STORAGE, row['author__avatar'])
+                else:
+                    item[field] = row[f'author__{field}']
+            result.append(item)
+        return result
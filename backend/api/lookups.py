@@ -0,0 +1,9 @@
+def followed_author_ids(request):
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    author_ids = getattr(request, 'followed_author_ids', None)
+    if author_ids is None:
+        author_ids = frozenset(request.user.follower.values_list(
+            'author_id', flat=True))
+        request.followed_author_ids = author_ids
+    return author_ids
@@ -0,0 +1,25 @@
+from django.core.cache import cache
+
+from recipes.constants import MEAL_PLAN_CACHE_SECONDS
+from recipes.models import Ingredient, MealPlan, TableVersion
+
+
+def plan_version_key(plan_id):
+    return TableVersion.key_for(MealPlan, plan_id)
+
+
+def cache_key(plan, start=None, end=None):
+    keys = [plan_version_key(plan.pk), TableVersion.key_for(Ingredient)]
+    versions = TableVersion.objects.snapshot(keys)
+    parts = [plan.pk, start, end] + [
+        versions.get(key, (0, None))[0] for key in keys]
+    return 'meal_plan_ingredients:' + ':'.join(map(str, parts))
+
+
+def ingredient_totals(plan, start=None, end=None):
+    key = cache_key(plan, start, end)
+    totals = cache.get(key)
+    if totals is None:
+        totals = list(plan.ingredient_totals(start, end))
+        cache.set(key, totals, MEAL_PLAN_CACHE_SECONDS)
+    return totals
@@ -0,0 +1,132 @@
+import gzip
+import re
+
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence
+
+from recipes.constants import (BROTLI_MAX_QUALITY, BROTLI_QUALITY,
+                               COMPRESSION_MIN_LENGTH, COMPRESSION_PATH_PREFIX,
+                               GZIP_LEVEL, ZOPFLI_ITERATIONS)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zopfli.gzip as zopfli_gzip
+except ImportError:
+    zopfli_gzip = None
+
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/(plain|csv|css|javascript)|application/(json|javascript|xml)'
+    r'|image/svg\+xml)')
+
+
+def accepted_encodings(request):
+    encodings = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = params.strip().partition('=')[2]
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(name.strip().lower())
+    return encodings
+
+
+def choose_encoding(request):
+    encodings = accepted_encodings(request)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_max(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_MAX_QUALITY)
+    if zopfli_gzip is not None:
+        return zopfli_gzip.compress(content, numiterations=ZOPFLI_ITERATIONS)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def compress_stream(chunks, encoding):
+    if encoding == 'gzip':
+        yield from compress_sequence(chunks)
+        return
+    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressedPayload:
+
+    def __init__(self, content):
+        self.content = content
+        self.encoded = {}
+
+    def encode(self, encoding):
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress_max(self.content, encoding)
+        return self.encoded[encoding]
+
+
+def weaken_etag(response):
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response.headers['ETag'] = f'W/{etag}'
+
+
+class CompressionMiddleware(MiddlewareMixin):
+
+    def process_response(self, request, response):
+        if not request.path.startswith(COMPRESSION_PATH_PREFIX):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.status_code == 304:
+            patch_vary_headers(response, ('Accept-Encoding',))
+            weaken_etag(response)
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        weaken_etag(response)
+        if not response.streaming and len(
+                response.content) < COMPRESSION_MIN_LENGTH:
+            return response
+        encoding = choose_encoding(request)
+        if encoding is None:
+            return response
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            payload = getattr(response, 'compressed_payload', None)
+            if payload is not None:
+                content = payload.encode(encoding)
+            else:
+                content = compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = encoding
+        return response
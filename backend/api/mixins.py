@@ -0,0 +1,94 @@
+from hashlib import md5
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipes.models import Favorite, ShoppingCart, Subscription, TableVersion
+from .middleware import CompressedPayload
+
+catalog_payloads = {}
+
+
+class ConditionalGetMixin:
+    version_models = ()
+    personal_version_models = (Favorite, ShoppingCart, Subscription)
+    personalized = False
+    cache_payloads = False
+
+    def get_version_keys(self, request):
+        keys = [TableVersion.key_for(model) for model in self.version_models]
+        if self.personalized and request.user.is_authenticated:
+            keys += [TableVersion.key_for(model, request.user.pk)
+                     for model in self.personal_version_models]
+        return keys
+
+    def get_conditional_state(self, request):
+        return TableVersion.objects.snapshot(self.get_version_keys(request))
+
+    def conditional_response(self, request, get_response):
+        state = self.get_conditional_state(request)
+        parts = [request.get_full_path()]
+        if self.personalized:
+            parts.append(str(request.user.pk))
+        parts += [f'{key}={value}' for key, (value, _) in sorted(
+            state.items())]
+        etag = quote_etag(md5('|'.join(parts).encode()).hexdigest())
+        last_modified = max(
+            (int(updated_at.timestamp()) for _, updated_at in state.values()),
+            default=None
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.cached_response(request, etag, get_response)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_response(self, request, etag, get_response):
+        renderer = request.accepted_renderer
+        if (not self.cache_payloads or self.action != 'list'
+                or request.query_params or renderer.format != 'json'):
+            return get_response()
+        key = (request.path, request.accepted_media_type)
+        cached = catalog_payloads.get(key)
+        if cached is None or cached[0] != etag:
+            response = get_response()
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (etag, CompressedPayload(renderer.render(
+                response.data, request.accepted_media_type,
+                self.get_renderer_context())))
+            catalog_payloads[key] = cached
+        response = HttpResponse(cached[1].content,
+                                content_type=renderer.media_type)
+        response.compressed_payload = cached[1]
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, lambda: super(ConditionalGetMixin, self).retrieve(
+                request, *args, **kwargs))
+
+
+class FlatListMixin:
+    flat_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        flat = self.flat_serializer_class(self.get_serializer_context())
+        queryset = flat.project(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(flat.serialize(page))
+        return Response(flat.serialize(queryset))
@@ -1,14 +1,43 @@
+from django.db import transaction
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
 from recipes.constants import (AMOUNT_INGREDIENT, COOKING_TIME,
                                MAX_LENGTH_USERNAME)
-from recipes.models import (Ingredient, IngredientInRecipe, Recipe, ShortLink,
-                            Subscription, Tag, User)
+from recipes.models import (Ingredient, IngredientInRecipe, MealPlan,
+                            MealPlanEntry, Recipe, ShortLink, Subscription,
+                            Tag, User)
 from recipes.validators import unicode_validator
+from .fieldsets import RECIPE_EXPANDABLE, SparseFieldset
+from .lookups import followed_author_ids
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    expandable_fields = ()
+
+    def get_collapsed_fields(self):
+        return {}
+
+    def is_top_level(self):
+        if isinstance(self.parent, serializers.ListSerializer):
+            return self.parent.parent is None
+        return self.parent is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self.is_top_level():
+            return fields
+        fieldset = SparseFieldset(request, fields, self.expandable_fields)
+        collapsed = self.get_collapsed_fields()
+        return {
+            name: (fields[name] if fieldset.is_expanded(name)
+                   or name not in collapsed else collapsed[name])
+            for name in fieldset.fields
+        }
+
+
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
     email = serializers.EmailField()
@@ -23,10 +52,7 @@ class UserSerializer(serializers.ModelSerializer):
                   'is_subscribed', 'avatar')
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        if not user.is_authenticated:
-            return False
-        return obj.following.filter(user=user, author=obj).exists()
+        return obj.id in followed_author_ids(self.context.get('request'))
 
 
 class AvatarSerializer(serializers.ModelSerializer):
@@ -54,8 +80,7 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                   'avatar', 'is_subscribed', 'recipes', 'recipes_count')
 
     def get_is_subscribed(self, obj):
-        request = self.context['request']
-        return request.user.following.filter(author=obj.author).exists()
+        return obj.author_id in followed_author_ids(self.context['request'])
 
     def get_recipes(self, obj):
         request = self.context.get('request')
@@ -100,7 +125,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.ReadOnlyField(source='ingredient_id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -111,7 +136,15 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class CollapsedIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient_id')
+
+    class Meta:
+        model = IngredientInRecipe
+        fields = ('id', 'amount')
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField()
     author = UserSerializer(read_only=True)
@@ -126,6 +159,17 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
 
+    expandable_fields = RECIPE_EXPANDABLE
+
+    def get_collapsed_fields(self):
+        return {
+            'author': serializers.PrimaryKeyRelatedField(read_only=True),
+            'tags': serializers.PrimaryKeyRelatedField(read_only=True,
+                                                       many=True),
+            'ingredients': CollapsedIngredientSerializer(
+                source='ingredientinrecipe', many=True, read_only=True),
+        }
+
     def get_image(self, obj):
         request = self.context.get('request')
         if obj.image:
@@ -142,15 +186,6 @@ class RecipeSerializer(serializers.ModelSerializer):
         return request.user.is_authenticated and obj.in_shoppingcart.filter(
             user=request.user).exists()
 
-    def validate_favorite(self, obj, user):
-        if obj.favorited_by.filter(user=user).exists():
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное')
-
-    def validate_shopping_cart(self, obj, user):
-        if obj.in_shoppingcart.filter(user=user).exists():
-            raise serializers.ValidationError('Рецепт уже добавлен в корзину')
-
     def validate(self, data):
         cooking_time = data.get('cooking_time')
         if cooking_time is None or cooking_time < COOKING_TIME:
@@ -203,6 +238,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         data['tags'] = tags
         return data
 
+    @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags', [])
         ingredients_data = validated_data.pop('ingredients', [])
@@ -219,6 +255,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
@@ -267,3 +304,60 @@ class ShortLinkSerializer(serializers.ModelSerializer):
         short_link = instance.short_link
         full_short_link = request.build_absolute_uri(short_link)
         return {'short-link': full_short_link}
+
+
+class MealPlanEntrySerializer(serializers.ModelSerializer):
+    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipe.objects.all())
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ('id', 'date', 'recipe', 'servings')
+
+
+class MealPlanSerializer(serializers.ModelSerializer):
+    entries = MealPlanEntrySerializer(many=True)
+
+    class Meta:
+        model = MealPlan
+        fields = ('id', 'name', 'entries')
+
+    def validate_entries(self, entries):
+        if not entries:
+            raise serializers.ValidationError(
+                'Необходимо добавить хотя бы один рецепт в план')
+        return entries
+
+    def create(self, validated_data):
+        entries_data = validated_data.pop('entries')
+        plan = MealPlan.objects.create(user=self.context['request'].user,
+                                       **validated_data)
+        self.save_entries(plan, entries_data)
+        return plan
+
+    def update(self, instance, validated_data):
+        entries_data = validated_data.pop('entries', None)
+        instance.name = validated_data.get('name', instance.name)
+        instance.save()
+        if entries_data is not None:
+            instance.entries.all().delete()
+            self.save_entries(instance, entries_data)
+        return instance
+
+    def save_entries(self, plan, entries_data):
+        MealPlanEntry.objects.bulk_create([
+            MealPlanEntry(plan=plan, **entry_data)
+            for entry_data in entries_data
+        ])
+
+
+class MealPlanRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, data):
+        start = data.get('start')
+        end = data.get('end')
+        if start and end and start > end:
+            raise serializers.ValidationError(
+                'Дата начала не может быть позже даты окончания')
+        return data
@@ -0,0 +1,60 @@
+import json
+
+from django.http import Http404
+
+from recipes.constants import SNAPSHOT_FORMAT
+from recipes.models import Favorite, Recipe, RecipeSnapshot, ShoppingCart
+from .flat_serializers import RecipeFlatSerializer
+from .lookups import followed_author_ids
+from .renderers import FastJSONRenderer, orjson
+
+
+def encode(data):
+    return FastJSONRenderer().render(data)
+
+
+def decode(payload):
+    payload = bytes(payload)
+    if orjson is None:
+        return json.loads(payload)
+    return orjson.loads(payload)
+
+
+def rebuild_snapshots(recipe_ids):
+    versions = RecipeSnapshot.objects.versions(recipe_ids)
+    flat = RecipeFlatSerializer({'request': None})
+    items = flat.serialize(flat.project(
+        Recipe.objects.filter(id__in=recipe_ids).order_by('id')))
+    RecipeSnapshot.objects.store(
+        {item['id']: encode(item) for item in items}, versions)
+    return {item['id']: item for item in items}
+
+
+def load_snapshot(recipe_id):
+    try:
+        payload = RecipeSnapshot.objects.filter(
+            recipe_id=recipe_id, format=SNAPSHOT_FORMAT
+        ).values_list('payload', flat=True).first()
+    except ValueError:
+        raise Http404
+    if payload is not None:
+        return decode(payload)
+    item = rebuild_snapshots([recipe_id]).get(int(recipe_id))
+    if item is None:
+        raise Http404
+    return item
+
+
+def personalize(request, item):
+    user = request.user
+    if user.is_authenticated:
+        item['is_favorited'] = Favorite.objects.filter(
+            user=user, recipe_id=item['id']).exists()
+        item['is_in_shopping_cart'] = ShoppingCart.objects.filter(
+            user=user, recipe_id=item['id']).exists()
+    author = item['author']
+    author['is_subscribed'] = author['id'] in followed_author_ids(request)
+    for data, field in ((item, 'image'), (author, 'avatar')):
+        if data[field]:
+            data[field] = request.build_absolute_uri(data[field])
+    return item
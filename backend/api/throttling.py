@@ -0,0 +1,66 @@
+from math import ceil
+
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import SimpleRateThrottle
+
+READ_SCOPE = 'read'
+WRITE_SCOPE = 'write'
+EXPORT_SCOPE = 'export'
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    cache = caches['throttle']
+    cache_format = 'throttle_%(scope)s_%(ident)s'
+
+    def __init__(self):
+        pass
+
+    def get_scope(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(
+            getattr(view, 'action', None))
+        if scope is None:
+            scope = (READ_SCOPE if request.method in SAFE_METHODS
+                     else WRITE_SCOPE)
+        if request.user.is_authenticated:
+            return scope
+        return f'anon_{scope}'
+
+    def get_cost(self, request, view):
+        return getattr(view, 'throttle_costs', {}).get(
+            getattr(view, 'action', None), 1)
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        self.scope = self.get_scope(request, view)
+        self.rate = self.get_rate()
+        if self.rate is None:
+            return True
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        self.key = self.get_cache_key(request, view)
+        now = int(self.timer() * 1000)
+        burst = self.duration * 1000
+        step = self.get_cost(request, view) * burst // self.num_requests
+        self.cache.add(self.key, now, self.duration)
+        try:
+            ready_at = self.cache.incr(self.key, step)
+        except ValueError:
+            ready_at = now + step
+            self.cache.add(self.key, ready_at, self.duration)
+        if ready_at - step < now:
+            ready_at = self.cache.incr(self.key, now - ready_at + step)
+        if ready_at - now > burst:
+            self.cache.decr(self.key, step)
+            self.wait_time = (ready_at - now - burst) / 1000
+            return False
+        self.cache.touch(self.key, ceil((ready_at - now) / 1000))
+        return True
+
+    def wait(self):
+        return self.wait_time
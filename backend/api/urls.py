@@ -3,15 +3,18 @@ from django.conf.urls.static import static
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .views import (IngredientViewSet, MealPlanViewSet, RecipeViewSet,
+                    SyncView, TagViewSet, UserViewSet)
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='users')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 router.register('recipes', RecipeViewSet, basename='recipes')
+router.register('meal-plans', MealPlanViewSet, basename='meal-plans')
 
 urlpatterns = [
+    path('sync/', SyncView.as_view(), name='sync'),
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
     path('', include('djoser.urls')),
@@ -1,44 +1,80 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
-from django.db.models import F, Sum
+from django.core import signing
+from django.db import transaction
+from django.db.models import Q, Sum
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
-                            ShoppingCart, ShortLink, Subscription, Tag)
+from recipes.constants import (SYNC_CHUNK_SIZE, SYNC_RETENTION_DAYS,
+                               SYNC_SETTLE_SECONDS, THROTTLE_LIST_COST,
+                               THROTTLE_RECOMMENDATIONS_COST,
+                               THROTTLE_SEARCH_COST, THROTTLE_UPLOAD_COST)
+from recipes.models import (ChangeLogEntry, Favorite, Ingredient,
+                            IngredientInRecipe, MealPlan, Recipe, RecipeScore,
+                            ShoppingCart, ShortLink, Subscription, Tag,
+                            TableVersion)
+from .fieldsets import RECIPE_EXPANDABLE, SparseFieldset
 from .filters import IngredientFilter, RecipeFilter
+from .flat_serializers import (USER_COLUMNS, IngredientFlatSerializer,
+                               RecipeFlatSerializer,
+                               SubscriptionFlatSerializer)
+from .meal_plans import ingredient_totals, plan_version_key
+from .mixins import ConditionalGetMixin, FlatListMixin
 from .pagination import UserListPagination
 from .permissions import IsOwnerOrReadOnly
 from .serializers import (AvatarSerializer, IngredientSerializer,
-                          RecipeSerializer, ShoppingCartRecipeSerializer,
+                          MealPlanRangeSerializer, MealPlanSerializer,
+                          RecipeListSerializer, RecipeSerializer,
+                          ShoppingCartRecipeSerializer,
                           ShortLinkSerializer, SubscriptionSerializer,
                           TagSerializer, UserSerializer)
+from .snapshots import load_snapshot, personalize, rebuild_snapshots
+from .throttling import EXPORT_SCOPE
 
 User = get_user_model()
 
 
-class UserViewSet(viewsets.GenericViewSet):
+class UserViewSet(DjoserUserViewSet):
+    lookup_field = 'pk'
     pagination_class = UserListPagination
+    throttle_costs = {
+        'list': THROTTLE_LIST_COST,
+        'subscriptions': THROTTLE_LIST_COST,
+        'recommendations': THROTTLE_RECOMMENDATIONS_COST,
+        'avatar': THROTTLE_UPLOAD_COST,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            fieldset = SparseFieldset(self.request, UserSerializer.Meta.fields)
+            return queryset.only('id', *(
+                field for field in fieldset.fields if field in USER_COLUMNS
+            )).order_by('id')
+        return queryset
 
     @action(methods=['get'], detail=False,
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        queryset = request.user.follower.all()
+        flat = SubscriptionFlatSerializer({'request': request})
+        queryset = flat.project(request.user.follower.all())
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
-            serializer = SubscriptionSerializer(page, many=True,
-                                                context={'request': request})
-            return paginator.get_paginated_response(serializer.data)
-        serializer = SubscriptionSerializer(queryset, many=True,
-                                            context={'request': request})
-        return Response(serializer.data)
+            return paginator.get_paginated_response(flat.serialize(page))
+        return Response(flat.serialize(queryset))
 
     @action(methods=['post', 'delete'], detail=True,
             permission_classes=[IsAuthenticated])
@@ -89,58 +125,146 @@ class UserViewSet(viewsets.GenericViewSet):
         serializer = UserSerializer(request.user, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(methods=['get'], detail=False, url_path='me/recommendations',
+            permission_classes=[IsAuthenticated])
+    def recommendations(self, request):
+        queryset = Recipe.objects.filter(
+            similar_to__recipe__favorited_by__user=request.user
+        ).exclude(
+            favorited_by__user=request.user
+        ).annotate(
+            rank=Sum('similar_to__score')
+        ).order_by('-rank', '-id')
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(queryset, request)
+        serializer = RecipeListSerializer(page, many=True,
+                                          context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    version_models = (Tag,)
+    cache_payloads = True
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
-
+class IngredientViewSet(ConditionalGetMixin, FlatListMixin,
+                        viewsets.ReadOnlyModelViewSet):
+    version_models = (Ingredient,)
+    cache_payloads = True
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    flat_serializer_class = IngredientFlatSerializer
     filter_backends = (IngredientFilter,)
     search_fields = ['^name']
     pagination_class = None
+    throttle_costs = {'list': THROTTLE_SEARCH_COST}
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, FlatListMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    flat_serializer_class = RecipeFlatSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     pagination_class = UserListPagination
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    personalized = True
+    throttle_scopes = {'download_shopping_cart': EXPORT_SCOPE}
+    throttle_costs = {
+        'list': THROTTLE_LIST_COST,
+        'similar': THROTTLE_RECOMMENDATIONS_COST,
+        'create': THROTTLE_UPLOAD_COST,
+        'update': THROTTLE_UPLOAD_COST,
+        'partial_update': THROTTLE_UPLOAD_COST,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'retrieve':
+            return queryset
+        fieldset = SparseFieldset(
+            self.request, RecipeSerializer.Meta.fields, RECIPE_EXPANDABLE)
+        columns = ['id', 'author'] + [
+            field for field in fieldset.fields
+            if field in ('name', 'image', 'text', 'cooking_time')]
+        if 'author' in fieldset and fieldset.is_expanded('author'):
+            queryset = queryset.select_related('author')
+            columns += [f'author__{field}' for field
+                        in UserSerializer.Meta.fields
+                        if field != 'is_subscribed']
+        if 'tags' in fieldset:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fieldset:
+            queryset = queryset.prefetch_related(
+                'ingredientinrecipe__ingredient'
+                if fieldset.is_expanded('ingredients')
+                else 'ingredientinrecipe')
+        return queryset.only(*columns)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.query_params.keys() & {'fields', 'expand'}:
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, lambda: Response(
+            personalize(request, load_snapshot(
+                self.kwargs[self.lookup_field]))))
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.schedule_snapshot(serializer.instance)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.schedule_snapshot(serializer.instance)
+
+    def schedule_snapshot(self, recipe):
+        transaction.on_commit(lambda: rebuild_snapshots([recipe.pk]))
+
+    @property
+    def version_models(self):
+        if self.action == 'retrieve':
+            return (Tag, Ingredient, User)
+        return (Recipe, RecipeScore, Tag, Ingredient, User)
+
+    def get_conditional_state(self, request):
+        state = super().get_conditional_state(request)
+        if self.action == 'retrieve':
+            try:
+                updated_at = Recipe.objects.filter(
+                    pk=self.kwargs[self.lookup_field]
+                ).values_list('updated_at', flat=True).first()
+            except ValueError:
+                updated_at = None
+            if updated_at is not None:
+                state['recipe'] = (updated_at.timestamp(), updated_at)
+        return state
 
     def handle_action(self, request, recipe, user, action_model):
+        is_favorite = action_model == Favorite
         if request.method == 'POST':
-            try:
-                serializer = self.get_serializer()
-                if action_model == Favorite:
-                    serializer.validate_favorite(recipe, user)
-                elif action_model == ShoppingCart:
-                    serializer.validate_shopping_cart(recipe, user)
-                action_model.objects.create(user=user, recipe=recipe)
-                response_serializer = ShoppingCartRecipeSerializer(
-                    recipe, context={'request': request})
-                return Response(response_serializer.data,
-                                status=status.HTTP_201_CREATED)
-            except ValidationError as e:
-                return Response({'detail': str(e)},
+            if not action_model.objects.add(user, recipe):
+                detail_msg = (
+                    'Рецепт уже добавлен в избранное' if is_favorite
+                    else 'Рецепт уже добавлен в корзину'
+                )
+                return Response({'detail': detail_msg},
                                 status=status.HTTP_400_BAD_REQUEST)
+            response_serializer = ShoppingCartRecipeSerializer(
+                recipe, context={'request': request})
+            return Response(response_serializer.data,
+                            status=status.HTTP_201_CREATED)
         elif request.method == 'DELETE':
-            instance = action_model.objects.filter(
-                user=user, recipe=recipe).first()
-            if not instance:
+            if not action_model.objects.remove(user, recipe):
                 detail_msg = (
                     'Рецепт не был добавлен '
-                    'в избранное' if action_model == Favorite
+                    'в избранное' if is_favorite
                     else 'Рецепт не был добавлен в корзину'
                 )
                 return Response({'detail': detail_msg},
                                 status=status.HTTP_400_BAD_REQUEST)
-            instance.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite',
@@ -166,22 +290,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ).values_list('recipe_id', flat=True)
         shopping_list = IngredientInRecipe.objects.filter(
             recipe__id__in=recipes_in_cart
-        ).values(
-            name=F('ingredient__name'),
-            unit=F('ingredient__measurement_unit')
-        ).annotate(amount=Sum('amount'))
+        ).totals()
         shopping_cart_text = 'Список покупок:\n'
         for ingredient in shopping_list:
             shopping_cart_text += (
                 f'{ingredient["name"]} - '
                 f'{ingredient["amount"]} '
-                f'{ingredient["unit"]}\n'
+                f'{ingredient["measurement_unit"]}\n'
             )
         response = HttpResponse(shopping_cart_text, content_type='text/plain')
         filename = 'shopping_cart.txt'
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        recipe = self.get_object()
+        recipes = Recipe.objects.filter(
+            similar_to__recipe=recipe
+        ).order_by('-similar_to__score')
+        serializer = RecipeListSerializer(recipes, many=True,
+                                          context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_link(self, request, pk=None):
         recipe = self.get_object()
@@ -206,6 +337,122 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class MealPlanViewSet(viewsets.ModelViewSet):
+    serializer_class = MealPlanSerializer
+    permission_classes = [IsAuthenticated]
+    throttle_costs = {'ingredients': THROTTLE_LIST_COST}
+
+    def get_queryset(self):
+        queryset = MealPlan.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            return queryset.prefetch_related('entries')
+        return queryset
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.bump_plan(serializer.instance)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.bump_plan(serializer.instance)
+
+    def bump_plan(self, plan):
+        TableVersion.objects.bump(plan_version_key(plan.pk))
+
+    @action(detail=True, methods=['get'])
+    def ingredients(self, request, pk=None):
+        plan = self.get_object()
+        serializer = MealPlanRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(ingredient_totals(plan, **serializer.validated_data))
+
+
+class SyncView(APIView):
+    token_salt = 'api.sync'
+    sections = (
+        ('recipes', Recipe),
+        ('tags', Tag),
+        ('ingredients', Ingredient),
+        ('favorites', Favorite),
+        ('shopping_cart', ShoppingCart),
+    )
+
+    def parse_token(self, token):
+        try:
+            return signing.loads(token, salt=self.token_salt,
+                                 max_age=timedelta(days=SYNC_RETENTION_DAYS))
+        except signing.SignatureExpired:
+            return None
+        except signing.BadSignature:
+            raise ValidationError(
+                {'since': 'Некорректный токен синхронизации'})
+
+    def make_token(self, change_id):
+        return signing.dumps(change_id, salt=self.token_salt)
+
+    def serialize_updated(self, model, ids):
+        if model is Recipe:
+            flat = RecipeFlatSerializer({'request': self.request})
+            return flat.serialize(
+                flat.project(Recipe.objects.filter(id__in=ids)))
+        if model is Tag:
+            return TagSerializer(Tag.objects.filter(id__in=ids),
+                                 many=True).data
+        if model is Ingredient:
+            return IngredientSerializer(
+                Ingredient.objects.filter(id__in=ids), many=True).data
+        return ids
+
+    def get(self, request):
+        user = request.user
+        entries = ChangeLogEntry.objects.filter(
+            created_at__lte=timezone.now() - timedelta(
+                seconds=SYNC_SETTLE_SECONDS)
+        ).filter(
+            Q(user_id__isnull=True) | Q(user_id=user.pk)
+            if user.is_authenticated else Q(user_id__isnull=True)
+        )
+        since = request.query_params.get('since')
+        if since is None:
+            latest = entries.order_by('-id').values_list(
+                'id', flat=True).first()
+            return Response({'next': self.make_token(latest or 0),
+                             'has_more': False})
+        since = self.parse_token(since)
+        if since is None:
+            return Response(
+                {'detail': 'Токен синхронизации устарел, требуется полная '
+                           'синхронизация',
+                 'full_resync': True},
+                status=status.HTTP_410_GONE)
+        chunk = list(entries.filter(id__gt=since).values_list(
+            'id', 'model', 'object_id', 'action')[:SYNC_CHUNK_SIZE + 1])
+        has_more = len(chunk) > SYNC_CHUNK_SIZE
+        chunk = chunk[:SYNC_CHUNK_SIZE]
+        actions = {}
+        for _, model, object_id, change_action in chunk:
+            actions[model, object_id] = change_action
+        data = {
+            'next': self.make_token(chunk[-1][0] if chunk else since),
+            'has_more': has_more,
+        }
+        for name, model in self.sections:
+            label = model._meta.label_lower
+            updated, deleted = [], []
+            for (entry_model, object_id), change_action in actions.items():
+                if entry_model != label:
+                    continue
+                if change_action == ChangeLogEntry.DELETE:
+                    deleted.append(object_id)
+                else:
+                    updated.append(object_id)
+            data[name] = {
+                'updated': self.serialize_updated(model, updated),
+                'deleted': deleted,
+            }
+        return Response(data)
+
+
 def redirect_to_full_link(request, short_id):
     short_link = f'/s/{short_id}'
     link_obj = get_object_or_404(ShortLink, short_link=short_link)
@@ -24,12 +24,20 @@ SECRET_KEY = os.getenv('SECRET_KEY')
 
 DEBUG = bool(strtobool(os.getenv('DEBUG', 'False')))
 
+BROWSABLE_API = bool(strtobool(os.getenv('BROWSABLE_API', str(DEBUG))))
+
+INVALIDATION_BUS = bool(strtobool(os.getenv('INVALIDATION_BUS', 'True')))
+
+INVALIDATION_POLL_INTERVAL = float(os.getenv('INVALIDATION_POLL_INTERVAL', 2))
+
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '').split(',')
 
 CSRF_TRUSTED_ORIGINS = os.environ.get('CSRF_TRUSTED_ORIGINS', '').split(',')
 
 SITE_ADDRESS = os.getenv('SITE_ADDRESS')
 
+THROTTLE_CACHE_URL = os.getenv('THROTTLE_CACHE_URL')
+
 INSTALLED_APPS = [
     'django.contrib.admin',
     'django.contrib.auth',
@@ -37,16 +45,22 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'recipes.apps.RecipesConfig',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
     'django_filters',
-    'django_extensions',
 ]
 
+DEV_APPS = ['django_extensions']
+
+if DEBUG:
+    INSTALLED_APPS += DEV_APPS
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -134,6 +148,15 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -150,6 +173,42 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
     'DEFAULT_PAGINATION_CLASS': 'api.pagination.UserListPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+    ] + (
+        ['rest_framework.renderers.BrowsableAPIRenderer']
+        if BROWSABLE_API else []
+    ),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    'NUM_PROXIES': 1,
+    'DEFAULT_THROTTLE_RATES': {
+        'read': '600/min',
+        'write': '120/min',
+        'export': '30/hour',
+        'anon_read': '300/min',
+        'anon_write': '30/min',
+        'anon_export': '10/hour',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': THROTTLE_CACHE_URL,
+    } if THROTTLE_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
 }
 
 DJOSER = {
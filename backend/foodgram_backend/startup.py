@@ -0,0 +1,51 @@
+import logging
+
+from django.db import DatabaseError, connections
+from django.test import RequestFactory
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_PATHS = (
+    '/api/recipes/', '/api/recipes/1/', '/api/recipes/1/favorite/',
+    '/api/recipes/download_shopping_cart/', '/api/tags/',
+    '/api/ingredients/', '/api/users/', '/api/users/me/',
+    '/api/users/subscriptions/', '/api/auth/token/login/', '/api/sync/',
+    '/s/abc/', '/admin/',
+)
+
+
+def warm_up():
+    from api import serializers, views
+    from recipes import tag_index
+
+    for path in WARM_UP_PATHS:
+        try:
+            resolve(path)
+        except Resolver404:
+            logger.warning('Путь прогрева не найден: %s', path)
+    for serializer_class in (serializers.RecipeSerializer,
+                             serializers.RecipeListSerializer,
+                             serializers.UserSerializer,
+                             serializers.SubscriptionSerializer,
+                             serializers.TagSerializer,
+                             serializers.IngredientSerializer):
+        serializer_class().fields
+    try:
+        tag_index.reload()
+        factory = RequestFactory()
+        for viewset, path in ((views.TagViewSet, '/api/tags/'),
+                              (views.IngredientViewSet, '/api/ingredients/')):
+            viewset.as_view({'get': 'list'}, throttle_classes=())(
+                factory.get(path, HTTP_ACCEPT='application/json'))
+    except DatabaseError:
+        logger.warning('Кэши каталога не прогреты: база недоступна')
+    finally:
+        connections.close_all()
+
+
+def start_worker():
+    from recipes.invalidation import start_listener
+
+    connections.close_all()
+    start_listener()
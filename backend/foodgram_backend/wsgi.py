@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
 application = get_wsgi_application()
+
+if not os.getenv('DEFER_WORKER_STARTUP'):
+    from foodgram_backend.startup import start_worker
+
+    start_worker()
@@ -0,0 +1,59 @@
+import math
+import os
+
+os.environ['DEFER_WORKER_STARTUP'] = '1'
+
+
+def available_cpus():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    for quota_path, period_path in (
+            ('/sys/fs/cgroup/cpu.max', None),
+            ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us',
+             '/sys/fs/cgroup/cpu/cpu.cfs_period_us')):
+        try:
+            with open(quota_path) as file:
+                values = file.read().split()
+            if period_path is not None:
+                with open(period_path) as file:
+                    values += file.read().split()
+        except OSError:
+            continue
+        if len(values) == 2 and values[0] not in ('max', '-1'):
+            return max(1, min(cpus, math.ceil(
+                int(values[0]) / int(values[1]))))
+        break
+    return cpus
+
+
+# Бюджет соединений с PostgreSQL (max_connections = 100 по умолчанию).
+# Каждый процесс держит до threads соединений для запросов и одно
+# соединение LISTEN для сброса кэшей, то есть workers * (threads + 1).
+# Сервис jobs занимает --workers + 1 соединений, ещё несколько нужны
+# для migrate, psql и superuser_reserved_connections. Поэтому число
+# процессов ограничено бюджетом GUNICORN_DB_CONNECTIONS, а не только
+# числом процессоров, доступных контейнеру.
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+db_connections = int(os.getenv('GUNICORN_DB_CONNECTIONS', 60))
+workers = int(os.getenv('GUNICORN_WORKERS', max(1, min(
+    available_cpus() * 2 + 1, db_connections // (threads + 1)))))
+worker_class = 'gthread'
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+
+def when_ready(server):
+    from foodgram_backend.startup import warm_up
+
+    warm_up()
+
+
+def post_fork(server, worker):
+    from foodgram_backend.startup import start_worker
+
+    start_worker()
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 
 from .constants import EXTRA_FIELD, MIN_NUMBER
-from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+from .models import (Favorite, Ingredient, IngredientInRecipe, Job, Recipe,
                      ShoppingCart, ShortLink, Subscription, Tag, User)
 
 
@@ -78,3 +79,30 @@ class RecipeAdmin(admin.ModelAdmin):
 
     favorited_users.short_description = 'Добавили в избранное'
     in_shopping_cart_users.short_description = 'Добавили в корзину'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'dedup_key',
+                    'created_at', 'run_after', 'latency')
+    list_filter = ('status', 'name')
+    search_fields = ('name', 'dedup_key')
+    readonly_fields = ('attempts', 'started_at', 'heartbeat_at',
+                       'finished_at', 'last_error')
+
+    def latency(self, obj):
+        if obj.started_at is None:
+            return None
+        return obj.started_at - obj.created_at
+    latency.short_description = 'Задержка запуска'
+
+    def changelist_view(self, request, extra_context=None):
+        stats = Job.objects.stats()
+        oldest = stats['oldest']
+        lag = (timezone.now() - oldest).total_seconds() if oldest else 0
+        self.message_user(
+            request,
+            f'В очереди: {stats["depth"]}, '
+            f'ожидание старейшей задачи: {lag:.0f} с'
+        )
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,221 @@
+import base64
+import json
+import os
+from collections import defaultdict
+from itertools import groupby
+
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import UniqueConstraint
+
+from .models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                     ShoppingCart, Subscription, Tag, User)
+
+
+class Section:
+
+    def __init__(self, model, fields, relations=None, match=(), log=None):
+        self.model = model
+        self.label = model._meta.label_lower
+        self.fields = fields
+        self.relations = relations or {}
+        self.match = match
+        self.log = log
+        self.columns = [model._meta.get_field(field).attname
+                        for field in fields]
+        self.match_columns = [model._meta.get_field(field).attname
+                              for field in match]
+        self.unique_columns = unique_columns(model)
+        self.files = [field for field in fields if hasattr(
+            model._meta.get_field(field), 'storage')]
+
+
+def unique_columns(model):
+    for constraint in model._meta.constraints:
+        if isinstance(constraint, UniqueConstraint) and (
+                constraint.condition is None):
+            return [model._meta.get_field(field).attname
+                    for field in constraint.fields]
+    for fields in model._meta.unique_together:
+        return [model._meta.get_field(field).attname for field in fields]
+    return []
+
+
+SECTIONS = (
+    Section(User, ('email', 'username', 'first_name', 'last_name',
+                   'password', 'avatar', 'is_active', 'is_staff',
+                   'is_superuser', 'date_joined', 'last_login'),
+            match=('email',)),
+    Section(Tag, ('name', 'slug'), match=('slug',), log=(Tag, 'pk', None)),
+    Section(Ingredient, ('name', 'measurement_unit'), match=('name',),
+            log=(Ingredient, 'pk', None)),
+    Section(Recipe, ('author', 'name', 'text', 'cooking_time', 'image'),
+            relations={'author': User},
+            match=('author', 'name', 'text', 'cooking_time', 'image'),
+            log=(Recipe, 'pk', None)),
+    Section(Recipe.tags.through, ('recipe', 'tag'),
+            relations={'recipe': Recipe, 'tag': Tag},
+            log=(Recipe, 'recipe_id', None)),
+    Section(IngredientInRecipe, ('recipe', 'ingredient', 'amount'),
+            relations={'recipe': Recipe, 'ingredient': Ingredient},
+            log=(Recipe, 'recipe_id', None)),
+    Section(Favorite, ('user', 'recipe', 'created_at'),
+            relations={'user': User, 'recipe': Recipe},
+            log=(Favorite, 'recipe_id', 'user_id')),
+    Section(ShoppingCart, ('user', 'recipe', 'created_at'),
+            relations={'user': User, 'recipe': Recipe},
+            log=(ShoppingCart, 'recipe_id', 'user_id')),
+    Section(Subscription, ('user', 'author'),
+            relations={'user': User, 'author': User},
+            log=(Subscription, 'author_id', 'user_id')),
+)
+SECTIONS_BY_LABEL = {section.label: section for section in SECTIONS}
+MAPPED_LABELS = {model._meta.label_lower for section in SECTIONS
+                 for model in section.relations.values()}
+
+id_maps = {}
+
+
+def dump_file(field, name, inline):
+    if not name or not inline:
+        return name
+    try:
+        with field.storage.open(name) as file:
+            content = file.read()
+    except OSError:
+        return name
+    return {'name': name, 'content': base64.b64encode(content).decode()}
+
+
+def export_rows(section, chunk_size, inline_files=False):
+    files = {field: section.model._meta.get_field(field)
+             for field in section.files}
+    for pk, *values in section.model.objects.order_by('pk').values_list(
+            'pk', *section.columns).iterator(chunk_size=chunk_size):
+        fields = dict(zip(section.fields, values))
+        for name, field in files.items():
+            fields[name] = dump_file(field, fields[name], inline_files)
+        yield json.dumps(
+            {'model': section.label, 'pk': pk, 'fields': fields},
+            cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def read_batches(stream, size):
+    records = (json.loads(line) for line in stream if line.strip())
+    for label, group in groupby(records, key=lambda record: record['model']):
+        batch = []
+        for record in group:
+            batch.append(record)
+            if len(batch) == size:
+                yield label, batch
+                batch = []
+        if batch:
+            yield label, batch
+
+
+def init_worker(maps):
+    id_maps.clear()
+    id_maps.update(maps)
+
+
+def load_file(field, value):
+    if not isinstance(value, dict):
+        return value
+    return field.storage.save(
+        field.generate_filename(None, os.path.basename(value['name'])),
+        ContentFile(base64.b64decode(value['content'])))
+
+
+def mapped_id(section, field, value):
+    return id_maps.get(
+        section.relations[field]._meta.label_lower, {}).get(value)
+
+
+def build_object(section, record):
+    values = {}
+    for field in section.fields:
+        value = record['fields'][field]
+        if field in section.relations:
+            value = mapped_id(section, field, value)
+            if value is None:
+                return None
+            field = section.model._meta.get_field(field).attname
+        elif field in section.files:
+            value = load_file(section.model._meta.get_field(field), value)
+        values[field] = value
+    return section.model(**values)
+
+
+def match_value(section, field, value):
+    if field in section.relations:
+        return mapped_id(section, field, value)
+    if isinstance(value, dict):
+        return value['name']
+    return value
+
+
+def match_key(section, record):
+    return tuple(match_value(section, field, record['fields'][field])
+                 for field in section.match)
+
+
+def match_existing(section, records):
+    keys = defaultdict(list)
+    for record in records:
+        keys[match_key(section, record)].append(record['pk'])
+    mapping = {}
+    for pk, *key in section.model.objects.filter(**{
+        f'{column}__in': {key[index] for key in keys}
+        for index, column in enumerate(section.match_columns)
+    }).order_by('pk').values_list('pk', *section.match_columns):
+        pks = keys.get(tuple(key))
+        if pks:
+            mapping[pks.pop(0)] = pk
+    return mapping
+
+
+def skip_existing(section, objects):
+    columns = section.unique_columns
+    if not columns or not objects:
+        return objects
+    seen = set(section.model.objects.filter(**{
+        f'{column}__in': {getattr(obj, column) for obj in objects}
+        for column in columns
+    }).values_list(*columns))
+    fresh = []
+    for obj in objects:
+        key = tuple(getattr(obj, column) for column in columns)
+        if key not in seen:
+            seen.add(key)
+            fresh.append(obj)
+    return fresh
+
+
+def logged_changes(section, objects):
+    if section.log is None:
+        return []
+    model, object_field, user_field = section.log
+    return [(model._meta.label_lower, getattr(obj, object_field),
+             getattr(obj, user_field) if user_field else None)
+            for obj in objects]
+
+
+@transaction.atomic
+def load_batch(task):
+    label, records = task
+    section = SECTIONS_BY_LABEL[label]
+    mapped = section.label in MAPPED_LABELS
+    mapping = match_existing(section, records) if section.match else {}
+    pending = [(record['pk'], build_object(section, record))
+               for record in records if record['pk'] not in mapping]
+    pending = [(pk, obj) for pk, obj in pending if obj is not None]
+    objects = [obj for _, obj in pending]
+    if not mapped:
+        objects = skip_existing(section, objects)
+    objects = section.model.objects.bulk_create(
+        objects, ignore_conflicts=not mapped)
+    if mapped:
+        mapping.update((pk, obj.pk) for (pk, _), obj in zip(pending, objects))
+    return (mapping, len(records), len(objects),
+            logged_changes(section, objects))
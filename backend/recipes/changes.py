@@ -0,0 +1,94 @@
+from django.db import connection, transaction
+
+from . import invalidation
+from .models import (ChangeLogEntry, MealPlan, MealPlanEntry, RecipeSnapshot,
+                     TableVersion)
+
+
+def meal_plan_keys(recipe_ids):
+    return [
+        TableVersion.key_for(MealPlan, plan_id)
+        for plan_id in MealPlanEntry.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('plan_id', flat=True).order_by().distinct()
+    ]
+
+
+class PendingChanges:
+
+    def __init__(self):
+        self.versions = set()
+        self.topics = {}
+        self.entries = {}
+        self.snapshot_ids = set()
+        self.meal_plan_ids = set()
+        self.scheduled = False
+        self.flushed = False
+
+    def is_open(self):
+        if not self.scheduled:
+            return True
+        return not self.flushed and any(
+            hook[1] == self.flush for hook in connection.run_on_commit)
+
+    def schedule(self):
+        if not self.scheduled:
+            self.scheduled = True
+            transaction.on_commit(self.flush)
+
+    def bump(self, *keys):
+        self.versions.update(keys)
+        self.schedule()
+
+    def publish(self, topic, key=None):
+        if topic in self.topics and self.topics[topic] != key:
+            key = None
+        self.topics[topic] = key
+        self.schedule()
+
+    def tables(self, *models):
+        for model in models:
+            key = TableVersion.key_for(model)
+            self.versions.add(key)
+            self.publish(key)
+
+    def record(self, model, object_ids, action, user_id=None):
+        label = model._meta.label_lower
+        for object_id in object_ids:
+            key = (label, object_id, user_id)
+            self.entries.pop(key, None)
+            self.entries[key] = action
+        self.schedule()
+
+    def snapshots(self, recipe_ids):
+        self.snapshot_ids.update(recipe_ids)
+        self.schedule()
+
+    def meal_plans(self, recipe_ids):
+        self.meal_plan_ids.update(recipe_ids)
+        self.schedule()
+
+    def flush(self):
+        self.flushed = True
+        if self.snapshot_ids:
+            RecipeSnapshot.objects.invalidate(sorted(self.snapshot_ids))
+        if self.meal_plan_ids:
+            self.versions.update(meal_plan_keys(self.meal_plan_ids))
+        if self.entries:
+            ChangeLogEntry.objects.bulk_create([
+                ChangeLogEntry(model=label, object_id=object_id,
+                               action=action, user_id=user_id)
+                for (label, object_id, user_id), action
+                in self.entries.items()
+            ])
+        if self.versions:
+            TableVersion.objects.bump(*sorted(self.versions))
+        for topic, key in self.topics.items():
+            invalidation.publish(topic, key)
+
+
+def pending():
+    changes = getattr(connection, 'pending_changes', None)
+    if changes is None or not changes.is_open():
+        changes = connection.pending_changes = PendingChanges()
+    return changes
@@ -19,3 +19,54 @@ MIN_VALUE_TIME = 1
 MIN_VALUE_ING = 1
 EXTRA_FIELD = 0
 MIN_NUMBER = 1
+MAX_LENGTH_VERSION_KEY = 128
+FAVORITE_SCORE_WEIGHT = 2
+CART_SCORE_WEIGHT = 1
+TRENDING_HALF_LIFE_HOURS = 72
+TRENDING_WINDOW_DAYS = 30
+TRENDING_REBASE_HALF_LIVES = 64
+SCORE_BATCH_SIZE = 1000
+RECOMMENDATIONS_TOP_K = 10
+CO_FAVORITE_WEIGHT = 0.7
+INGREDIENT_SIMILARITY_WEIGHT = 0.3
+RECOMMENDATIONS_BATCH_SIZE = 500
+TAG_MASK_BITS = 63
+COMPRESSION_MIN_LENGTH = 1000
+COMPRESSION_PATH_PREFIX = '/api/'
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+BROTLI_MAX_QUALITY = 11
+ZOPFLI_ITERATIONS = 15
+MAX_LENGTH_CHANGE_ACTION = 16
+SYNC_CHUNK_SIZE = 500
+SYNC_SETTLE_SECONDS = 2
+SYNC_RETENTION_DAYS = 30
+SYNC_PRUNE_BATCH_SIZE = 5000
+SYNC_PRUNE_INTERVAL_SECONDS = 3600
+MAX_LENGTH_JOB_NAME = 128
+MAX_LENGTH_JOB_KEY = 255
+MAX_LENGTH_JOB_STATUS = 16
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 10
+JOB_TIMEOUT_SECONDS = 120
+JOB_HEARTBEAT_SECONDS = 30
+JOB_POLL_SECONDS = 1
+SCORES_REFRESH_INTERVAL_SECONDS = 60
+RECOMMENDATIONS_INTERVAL_SECONDS = 300
+SNAPSHOT_REBUILD_INTERVAL_SECONDS = 60
+THROTTLE_SEARCH_COST = 2
+THROTTLE_LIST_COST = 2
+THROTTLE_RECOMMENDATIONS_COST = 3
+THROTTLE_UPLOAD_COST = 5
+BACKUP_CHUNK_SIZE = 2000
+BACKUP_BATCH_SIZE = 1000
+SNAPSHOT_BATCH_SIZE = 500
+SNAPSHOT_FORMAT = 1
+MAX_LENGTH_MEDIA_NAME = 100
+MEDIA_CONTENT_DIR = 'content'
+MEDIA_GC_BATCH_SIZE = 1000
+MEDIA_GC_GRACE_SECONDS = 3600
+MAX_LENGTH_MEAL_PLAN_NAME = 256
+MIN_VALUE_SERVINGS = 1
+MEAL_PLAN_CACHE_SECONDS = 3600
+TAG_INDEX_RELOAD_SECONDS = 5
@@ -0,0 +1,112 @@
+import logging
+import os
+import select
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import TableVersion
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'foodgram_invalidation'
+
+handlers = defaultdict(list)
+listener = {'pid': None, 'thread': None, 'ready': threading.Event()}
+senders = {}
+
+
+def sender_id():
+    return senders.setdefault(os.getpid(), uuid.uuid4().hex[:12])
+
+
+def register(topic, handler):
+    handlers[topic].append(handler)
+
+
+def dispatch(topic, key):
+    for handler in handlers.get(topic, ()):
+        try:
+            handler(key)
+        except Exception:
+            logger.exception('Ошибка обработчика инвалидации %s', topic)
+
+
+def dispatch_all():
+    for topic in list(handlers):
+        dispatch(topic, None)
+
+
+def uses_notify():
+    return connection.vendor == 'postgresql'
+
+
+def publish(topic, key=None):
+    def send():
+        dispatch(topic, key)
+        if uses_notify():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [
+                    CHANNEL, f'{sender_id()}:{topic}:{key or ""}'])
+
+    transaction.on_commit(send)
+
+
+def apply_notification(payload):
+    sender, topic, key = payload.split(':', 2)
+    if sender != sender_id():
+        dispatch(topic, key or None)
+
+
+def listen():
+    while True:
+        try:
+            connection.ensure_connection()
+            raw = connection.connection
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            dispatch_all()
+            listener['ready'].set()
+            while True:
+                if select.select([raw], [], [],
+                                 settings.INVALIDATION_POLL_INTERVAL)[0]:
+                    raw.poll()
+                    while raw.notifies:
+                        apply_notification(raw.notifies.pop(0).payload)
+        except Exception:
+            logger.exception('Слушатель инвалидации переподключается')
+            connection.close()
+            time.sleep(settings.INVALIDATION_POLL_INTERVAL)
+
+
+def poll():
+    known = {}
+    while True:
+        try:
+            topics = list(handlers)
+            current = TableVersion.objects.snapshot(topics)
+            for topic in topics:
+                version = current.get(topic, (0, None))[0]
+                if topic in known and known[topic] != version:
+                    dispatch(topic, None)
+                known[topic] = version
+            listener['ready'].set()
+        except Exception:
+            logger.exception('Ошибка опроса версий для инвалидации')
+            connection.close()
+        time.sleep(settings.INVALIDATION_POLL_INTERVAL)
+
+
+def start_listener():
+    if not settings.INVALIDATION_BUS or listener['pid'] == os.getpid():
+        return
+    thread = threading.Thread(
+        target=listen if uses_notify() else poll,
+        name='invalidation-listener', daemon=True)
+    listener.update(pid=os.getpid(), thread=thread,
+                    ready=threading.Event())
+    thread.start()
@@ -0,0 +1,73 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.db import IntegrityError, close_old_connections
+from django.utils import timezone
+
+from .constants import JOB_RETRY_BASE_SECONDS
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+tasks = {}
+intervals = {}
+
+
+def task(name, every=None):
+    def decorator(func):
+        tasks[name] = func
+        if every is not None:
+            intervals[name] = every
+        return func
+    return decorator
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=0, **options):
+    if name not in tasks:
+        raise KeyError(f'Неизвестная задача: {name}')
+    Job.objects.enqueue(
+        name, payload, dedup_key,
+        run_after=timezone.now() + timedelta(seconds=delay), **options)
+
+
+def schedule_periodic():
+    scheduled = set(Job.objects.pending().filter(
+        name__in=intervals).values_list('name', flat=True))
+    for name in intervals.keys() - scheduled:
+        enqueue(name, dedup_key=name)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+
+def fail(job):
+    now = timezone.now()
+    retry = job.attempts < job.max_attempts
+    error = traceback.format_exc()
+    try:
+        Job.objects.filter(id=job.id).update(
+            status=Job.QUEUED if retry else Job.FAILED,
+            run_after=now + retry_delay(job.attempts),
+            finished_at=None if retry else now, last_error=error)
+    except IntegrityError:
+        Job.objects.filter(id=job.id).update(
+            status=Job.FAILED, finished_at=now, last_error=error)
+
+
+def execute(job_id):
+    close_old_connections()
+    job = Job.objects.get(id=job_id)
+    try:
+        tasks[job.name](**job.payload)
+    except Exception:
+        logger.exception('Ошибка фоновой задачи %s', job)
+        fail(job)
+    else:
+        Job.objects.filter(id=job_id).update(
+            status=Job.DONE, finished_at=timezone.now(), last_error='')
+    if job.name in intervals:
+        enqueue(job.name, dedup_key=job.name, delay=intervals[job.name])
+    close_old_connections()
+    return job_id
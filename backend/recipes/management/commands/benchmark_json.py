@@ -0,0 +1,41 @@
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeSerializer
+from recipes.constants import PAGE_SIZE
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость JSON-рендереров на страницах рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=PAGE_SIZE,
+                            help='Количество рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=200,
+                            help='Количество повторов кодирования')
+
+    def handle(self, *args, **options):
+        request = Request(RequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        recipes = Recipe.objects.all()[:options['page_size']]
+        data = {
+            'count': len(recipes), 'next': None, 'previous': None,
+            'results': RecipeSerializer(
+                recipes, many=True, context={'request': request}).data,
+        }
+        baseline = None
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            elapsed = timeit.timeit(lambda: renderer.render(data),
+                                    number=options['repeat'])
+            per_page = elapsed / options['repeat'] * 1000
+            baseline = baseline or per_page
+            self.stdout.write(
+                f'{type(renderer).__name__}: {per_page:.3f} мс/страница '
+                f'(x{baseline / per_page:.1f})')
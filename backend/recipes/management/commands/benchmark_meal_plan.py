@@ -0,0 +1,117 @@
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.meal_plans import cache_key
+from recipes.models import (IngredientInRecipe, MealPlan, MealPlanEntry,
+                            Recipe, User)
+
+MAX_SERVINGS = 4
+
+
+class Command(BaseCommand):
+    help = ('Измеряет расчёт списка ингредиентов для плана питания '
+            'и проверяет, что он выполняется одним запросом')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--weeks', type=int, default=4,
+            help='Продолжительность плана в неделях')
+        parser.add_argument(
+            '--recipes', type=int, default=80,
+            help='Количество рецептов в плане')
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов каждого замера')
+
+    def handle(self, *args, **options):
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[
+            :options['recipes']])
+        if len(recipe_ids) < options['recipes']:
+            raise CommandError(
+                'Недостаточно рецептов в базе, используйте '
+                'check_query_plans --seed')
+        with transaction.atomic():
+            plan = self.build_plan(recipe_ids, options['weeks'])
+            client = APIClient()
+            client.force_authenticate(plan.user)
+            url = f'/api/meal-plans/{plan.pk}/ingredients/'
+            table = IngredientInRecipe._meta.db_table
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                queries = context.captured_queries
+                cold, warm = [], []
+                for _ in range(options['repeat']):
+                    cache.delete(cache_key(plan))
+                    cold.append(self.measure(client, url))
+                    warm.append(self.measure(client, url))
+            cache.delete(cache_key(plan))
+            aggregations = [query for query in queries
+                            if table in query['sql']]
+            expected = self.expected_totals(plan)
+            transaction.set_rollback(True)
+        if response.status_code != 200:
+            raise CommandError(f'Ответ API: {response.status_code}')
+        totals = {(item['name'], item['measurement_unit']): item['amount']
+                  for item in response.data}
+        if totals != expected:
+            raise CommandError('Итоги API не совпадают с поштучным расчётом')
+        self.stdout.write(
+            f'Рецептов в плане: {len(recipe_ids)}, '
+            f'ингредиентов в итоге: {len(totals)}')
+        self.stdout.write(
+            f'Запросов за ответ: {len(queries)}, '
+            f'из них агрегаций: {len(aggregations)}')
+        for label, timings in (('без кэша', cold), ('из кэша', warm)):
+            timings.sort()
+            self.stdout.write(
+                f'{label}: медиана {timings[len(timings) // 2]:.2f} мс, '
+                f'максимум {timings[-1]:.2f} мс')
+        if len(aggregations) != 1:
+            raise CommandError(
+                f'Ожидался один запрос агрегации, выполнено '
+                f'{len(aggregations)}')
+        self.stdout.write(self.style.SUCCESS(
+            'План рассчитан одним запросом к базе'))
+
+    def build_plan(self, recipe_ids, weeks):
+        rng = random.Random(len(recipe_ids))
+        stamp = int(time.time())
+        user = User.objects.create(
+            email=f'meal-plan-{stamp}@example.com',
+            username=f'meal-plan-{stamp}',
+            first_name='План', last_name='Питания', password='!')
+        plan = MealPlan.objects.create(user=user, name='Бенчмарк')
+        start = timezone.localdate()
+        days = weeks * 7
+        MealPlanEntry.objects.bulk_create([
+            MealPlanEntry(plan=plan, recipe_id=recipe_id,
+                          date=start + timedelta(days=number % days),
+                          servings=rng.randint(1, MAX_SERVINGS))
+            for number, recipe_id in enumerate(recipe_ids)
+        ])
+        return plan
+
+    def measure(self, client, url):
+        started = time.perf_counter()
+        client.get(url)
+        return (time.perf_counter() - started) * 1000
+
+    def expected_totals(self, plan):
+        totals = defaultdict(int)
+        for entry in plan.entries.all():
+            for item in IngredientInRecipe.objects.filter(
+                    recipe_id=entry.recipe_id).select_related('ingredient'):
+                key = (item.ingredient.name,
+                       item.ingredient.measurement_unit)
+                totals[key] += item.amount * entry.servings
+        return dict(totals)
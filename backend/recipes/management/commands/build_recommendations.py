@@ -0,0 +1,196 @@
+import heapq
+import os
+from collections import defaultdict
+from math import sqrt
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from recipes.constants import (CO_FAVORITE_WEIGHT,
+                               INGREDIENT_SIMILARITY_WEIGHT,
+                               RECOMMENDATIONS_BATCH_SIZE,
+                               RECOMMENDATIONS_TOP_K)
+from recipes.models import (ChangeLogEntry, Favorite, IngredientInRecipe,
+                            Recipe, RecipeNeighbor, TableVersion)
+
+CHUNK_SIZE = 10000
+SOURCES = {
+    'favorites': (Favorite.objects, 'recipe', 'user', CO_FAVORITE_WEIGHT),
+    'ingredients': (IngredientInRecipe.objects, 'recipe', 'ingredient',
+                    INGREDIENT_SIMILARITY_WEIGHT),
+}
+
+matrices = {}
+
+
+def load_matrix(queryset, row_field, column_field, recipe_ids=None):
+    rows = defaultdict(set)
+    columns = defaultdict(set)
+    pairs = queryset.values_list(row_field, column_field)
+    if recipe_ids is None:
+        for row, column in pairs.iterator(chunk_size=CHUNK_SIZE):
+            rows[row].add(column)
+            columns[column].add(row)
+        return (dict(rows), dict(columns),
+                {row: len(vector) for row, vector in rows.items()})
+    column_ids = set()
+    for chunk in batches(recipe_ids, CHUNK_SIZE):
+        column_ids.update(pairs.filter(
+            **{f'{row_field}__in': chunk}).values_list(
+                column_field, flat=True))
+    for chunk in batches(column_ids, CHUNK_SIZE):
+        for row, column in pairs.filter(**{f'{column_field}__in': chunk}):
+            rows[row].add(column)
+            columns[column].add(row)
+    norms = {}
+    for chunk in batches(rows, CHUNK_SIZE):
+        norms.update(queryset.filter(**{f'{row_field}__in': chunk}).values(
+            row_field).annotate(total=Count(column_field)).values_list(
+                row_field, 'total').order_by())
+    return dict(rows), dict(columns), norms
+
+
+def load_matrices(recipe_ids=None):
+    return {
+        name: load_matrix(queryset, row_field, column_field, recipe_ids)
+        for name, (queryset, row_field, column_field, _)
+        in SOURCES.items()
+    }
+
+
+def init_worker(loaded):
+    matrices.update(loaded)
+
+
+def cosine(recipe_id, rows, columns, norms):
+    vector = rows.get(recipe_id, ())
+    overlap = defaultdict(int)
+    for column in vector:
+        for other in columns[column]:
+            overlap[other] += 1
+    overlap.pop(recipe_id, None)
+    return {
+        other: common / sqrt(len(vector) * norms[other])
+        for other, common in overlap.items()
+    }
+
+
+def similarities(recipe_id):
+    scores = defaultdict(float)
+    for name, (*_, weight) in SOURCES.items():
+        for other, similarity in cosine(
+                recipe_id, *matrices[name]).items():
+            scores[other] += weight * similarity
+    return scores
+
+
+def top_neighbors(recipe_ids):
+    return [
+        (recipe_id, heapq.nlargest(
+            RECOMMENDATIONS_TOP_K, similarities(recipe_id).items(),
+            key=lambda item: item[1]))
+        for recipe_id in recipe_ids
+    ]
+
+
+def partners(changed):
+    recipe_ids = set().union(*changed.values())
+    found = set()
+    for chunk in batches(recipe_ids, CHUNK_SIZE):
+        found.update(RecipeNeighbor.objects.filter(
+            neighbor__in=chunk).values_list('recipe', flat=True))
+    candidates = defaultdict(float)
+    for name, changed_ids in changed.items():
+        for recipe_id in changed_ids:
+            scores = similarities(recipe_id)
+            for other in cosine(recipe_id, *matrices[name]):
+                candidates[other] = max(candidates[other], scores[other])
+    for chunk in batches(set(candidates) - recipe_ids - found, CHUNK_SIZE):
+        lowest = {
+            recipe_id: (total, score)
+            for recipe_id, total, score in RecipeNeighbor.objects.filter(
+                recipe__in=chunk).values('recipe').annotate(
+                    total=Count('id'), lowest=Min('score')).values_list(
+                        'recipe', 'total', 'lowest').order_by()
+        }
+        for recipe_id in chunk:
+            total, score = lowest.get(recipe_id, (0, 0))
+            if (total < RECOMMENDATIONS_TOP_K
+                    or candidates[recipe_id] > score):
+                found.add(recipe_id)
+    return found
+
+
+def batches(items, size):
+    items = sorted(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает таблицу похожих рецептов для рекомендаций'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать соседей всех рецептов, а не только изменённых')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество параллельных процессов')
+        parser.add_argument(
+            '--batch-size', type=int, default=RECOMMENDATIONS_BATCH_SIZE,
+            help='Количество рецептов в одной пачке')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        key = TableVersion.key_for(RecipeNeighbor)
+        last_run = TableVersion.objects.filter(name=key).values_list(
+            'updated_at', flat=True).first()
+        if options['full'] or last_run is None:
+            recipe_ids = set(Recipe.objects.values_list('id', flat=True))
+            loaded = load_matrices()
+        else:
+            changed = {
+                'favorites': set(Recipe.objects.filter(
+                    favorited_by__created_at__gt=last_run
+                ).values_list('id', flat=True).distinct()),
+                'ingredients': set(Recipe.objects.filter(
+                    updated_at__gt=last_run).values_list('id', flat=True)),
+            }
+            changed['favorites'].update(ChangeLogEntry.objects.filter(
+                model=Favorite._meta.label_lower,
+                action=ChangeLogEntry.DELETE,
+                created_at__gt=last_run
+            ).values_list('object_id', flat=True).distinct())
+            recipe_ids = set().union(*changed.values())
+            init_worker(load_matrices(recipe_ids))
+            recipe_ids |= partners(changed)
+            loaded = load_matrices(recipe_ids)
+        chunks = batches(recipe_ids, options['batch_size'])
+        if options['workers'] > 1:
+            connections.close_all()
+            with Pool(options['workers'], initializer=init_worker,
+                      initargs=(loaded,)) as pool:
+                for result in pool.imap_unordered(top_neighbors, chunks):
+                    self.save(result)
+        else:
+            init_worker(loaded)
+            for chunk in chunks:
+                self.save(top_neighbors(chunk))
+        TableVersion.objects.bump(key, at=started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено соседей для рецептов: {len(recipe_ids)}'))
+
+    @transaction.atomic
+    def save(self, result):
+        RecipeNeighbor.objects.filter(
+            recipe_id__in=[recipe_id for recipe_id, _ in result]).delete()
+        RecipeNeighbor.objects.bulk_create([
+            RecipeNeighbor(recipe_id=recipe_id, neighbor_id=neighbor_id,
+                           score=score)
+            for recipe_id, neighbors in result
+            for neighbor_id, score in neighbors
+        ])
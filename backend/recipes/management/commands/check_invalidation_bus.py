@@ -0,0 +1,68 @@
+import multiprocessing
+import queue
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from recipes import invalidation
+from recipes.models import TableVersion
+
+TOPIC = 'recipes.invalidationcheck'
+
+
+def worker(ready, received):
+    connections.close_all()
+    invalidation.listener['pid'] = None
+    invalidation.register(TOPIC, lambda key: received.put(
+        (multiprocessing.current_process().name, key)))
+    invalidation.start_listener()
+    invalidation.listener['ready'].wait()
+    ready.put(multiprocessing.current_process().name)
+    multiprocessing.Event().wait()
+
+
+class Command(BaseCommand):
+    help = ('Запускает несколько процессов и проверяет, что все они '
+            'получают сообщения шины инвалидации')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=3,
+                            help='Количество процессов-слушателей')
+        parser.add_argument('--timeout', type=float, default=10,
+                            help='Время ожидания доставки в секундах')
+
+    def handle(self, *args, **options):
+        if not settings.INVALIDATION_BUS:
+            raise CommandError('Шина инвалидации отключена')
+        context = multiprocessing.get_context('fork')
+        ready, received = context.Queue(), context.Queue()
+        connections.close_all()
+        processes = [
+            context.Process(target=worker, args=(ready, received),
+                            name=f'listener-{number}', daemon=True)
+            for number in range(options['processes'])
+        ]
+        for process in processes:
+            process.start()
+        delivered = set()
+        try:
+            for _ in processes:
+                ready.get(timeout=options['timeout'])
+            key = uuid.uuid4().hex
+            TableVersion.objects.bump(TOPIC)
+            invalidation.publish(TOPIC, key)
+            while len(delivered) < len(processes):
+                name, received_key = received.get(timeout=options['timeout'])
+                if received_key in (key, None):
+                    delivered.add(name)
+        except queue.Empty:
+            raise CommandError(
+                f'Сообщение получили {len(delivered)} из {len(processes)} '
+                f'процессов')
+        finally:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Все процессы получили сообщение: {len(processes)}'))
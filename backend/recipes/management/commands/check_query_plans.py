@@ -0,0 +1,242 @@
+import json
+import random
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.views import SyncView
+from recipes.changes import pending
+from recipes.constants import BACKUP_BATCH_SIZE
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag, User)
+
+SEED_PREFIX = 'plan-check'
+RECIPES_PER_USER = 10
+INGREDIENTS_PER_RECIPE = 3
+TAGS_PER_RECIPE = 2
+FAVORITES_PER_USER = 20
+CART_ITEMS_PER_USER = 5
+SUBSCRIPTIONS_PER_USER = 5
+ALLOWED_SEQ_SCANS = (
+    ('recipes_recipe', 'tag_mask'),
+)
+
+ENDPOINTS = (
+    '/api/recipes/',
+    '/api/recipes/?author={author}',
+    '/api/recipes/?tags={tag}',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/?ordering=popular',
+    '/api/recipes/?ordering=trending',
+    '/api/recipes/?fields=id,name&expand=',
+    '/api/recipes/{recipe}/',
+    '/api/recipes/{recipe}/similar/',
+    '/api/recipes/{recipe}/get-link/',
+    '/api/recipes/download_shopping_cart/',
+    '/api/tags/',
+    '/api/ingredients/?name={ingredient}',
+    '/api/users/',
+    '/api/users/{author}/',
+    '/api/users/me/',
+    '/api/users/subscriptions/?recipes_limit=3',
+    '/api/users/me/recommendations/',
+    '/api/sync/?since={since}',
+)
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+def is_allowed(table, condition):
+    return any(table == allowed_table and column in condition
+               for allowed_table, column in ALLOWED_SEQ_SCANS)
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы всех эндпоинтов API, строит для них EXPLAIN '
+            'и сообщает о последовательном сканировании больших таблиц '
+            'и сортировках без индекса под LIMIT')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Создать указанное количество тестовых рецептов '
+                 '(только для отдельной проверочной базы)')
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help='Размер таблицы, начиная с которого сканирование '
+                 'с фильтром считается ошибкой')
+        parser.add_argument(
+            '--max-selectivity', type=float, default=0.5,
+            help='Доля строк таблицы, которую должен отбирать фильтр, '
+                 'чтобы сканирование считалось ошибкой')
+        parser.add_argument(
+            '--user', help='Email пользователя, от имени которого '
+                           'выполняются запросы')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов доступна только в PostgreSQL')
+        if options['seed']:
+            self.seed(options['seed'])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            sizes = dict(cursor.fetchall())
+        client = APIClient()
+        client.force_authenticate(self.get_user(options['user']))
+        params = self.get_params()
+        violations = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for template in ENDPOINTS:
+                url = template.format(**params)
+                with CaptureQueriesContext(connection) as context:
+                    response = client.get(url)
+                found = self.check_queries(
+                    context.captured_queries, sizes, options['min_rows'],
+                    options['max_selectivity'])
+                violations += [(url, *item) for item in found]
+                self.stdout.write(
+                    f'{url}: {response.status_code}, '
+                    f'запросов {len(context)}, '
+                    f'проблем {len(found)}')
+        for url, problem, sql in violations:
+            self.stderr.write(f'{url}: {problem}\n    {sql}')
+        if violations:
+            raise CommandError(
+                f'Найдено проблем в планах запросов: {len(violations)}')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def check_queries(self, queries, sizes, min_rows, max_selectivity):
+        found = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                found += [(problem, sql) for problem in self.check_plan(
+                    plan[0]['Plan'], sizes, min_rows, max_selectivity)]
+        return found
+
+    def check_plan(self, plan, sizes, min_rows, max_selectivity):
+        problems = []
+        for node in plan_nodes(plan):
+            table = node.get('Relation Name')
+            size = sizes.get(table, 0)
+            if (node['Node Type'] == 'Seq Scan' and 'Filter' in node
+                    and size >= min_rows
+                    and node['Plan Rows'] < size * max_selectivity
+                    and not is_allowed(table, node['Filter'])):
+                problems.append(f'Seq Scan по {table} ({node["Filter"]})')
+            if node['Node Type'] != 'Limit':
+                continue
+            for sort in plan_nodes(node):
+                if sort['Node Type'] != 'Sort':
+                    continue
+                problems += [
+                    f'Sort по Seq Scan {scan["Relation Name"]} под Limit '
+                    f'({", ".join(sort["Sort Key"])})'
+                    for scan in plan_nodes(sort)
+                    if scan['Node Type'] == 'Seq Scan'
+                    and sizes.get(scan['Relation Name'], 0) >= min_rows
+                    and not is_allowed(scan['Relation Name'],
+                                       scan.get('Filter', ''))
+                ]
+        return problems
+
+    def get_user(self, email):
+        users = User.objects.all()
+        if email:
+            users = users.filter(email=email)
+        user = users.order_by('-id').filter(
+            favorited_by__isnull=False).first()
+        user = user or users.order_by('-id').first()
+        if user is None:
+            raise CommandError('В базе нет пользователей для проверки')
+        return user
+
+    def get_params(self):
+        recipe = Recipe.objects.order_by('-id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or tag is None or ingredient is None:
+            raise CommandError(
+                'В базе нет рецептов, тегов или ингредиентов, '
+                'используйте --seed')
+        return {
+            'recipe': recipe.id,
+            'author': recipe.author_id,
+            'tag': tag.slug,
+            'ingredient': ingredient.name[:2],
+            'since': SyncView().make_token(0),
+        }
+
+    def seed(self, count):
+        rng = random.Random(count)
+        start = User.objects.count()
+        users = User.objects.bulk_create([
+            User(email=f'{SEED_PREFIX}-{start + number}@example.com',
+                 username=f'{SEED_PREFIX}-{start + number}',
+                 first_name='План', last_name='Проверка', password='!')
+            for number in range(count // RECIPES_PER_USER + 1)
+        ], batch_size=BACKUP_BATCH_SIZE)
+        tags = list(Tag.objects.all()) or Tag.objects.bulk_create([
+            Tag(name=f'{SEED_PREFIX}-{number}',
+                slug=f'{SEED_PREFIX}-{number}')
+            for number in range(TAGS_PER_RECIPE * 2)
+        ])
+        start = Ingredient.objects.count()
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'{SEED_PREFIX}-{start + number}',
+                       measurement_unit='г')
+            for number in range(count // INGREDIENTS_PER_RECIPE + 1)
+        ], batch_size=BACKUP_BATCH_SIZE)
+        recipes = Recipe.objects.bulk_create([
+            Recipe(author=rng.choice(users), name=f'{SEED_PREFIX}-{number}',
+                   text=SEED_PREFIX, cooking_time=rng.randint(1, 120),
+                   image=f'recipes/images/{SEED_PREFIX}.png')
+            for number in range(count)
+        ], batch_size=BACKUP_BATCH_SIZE)
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in rng.sample(tags, min(TAGS_PER_RECIPE, len(tags)))
+        ], batch_size=BACKUP_BATCH_SIZE)
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=rng.randint(1, 500))
+            for recipe in recipes
+            for ingredient in rng.sample(ingredients, min(
+                INGREDIENTS_PER_RECIPE, len(ingredients)))
+        ], batch_size=BACKUP_BATCH_SIZE)
+        for model, size in ((Favorite, FAVORITES_PER_USER),
+                            (ShoppingCart, CART_ITEMS_PER_USER)):
+            model.objects.bulk_create([
+                model(user=user, recipe=recipe)
+                for user in users
+                for recipe in rng.sample(recipes, min(size, len(recipes)))
+            ], batch_size=BACKUP_BATCH_SIZE, ignore_conflicts=True)
+        Subscription.objects.bulk_create([
+            Subscription(user=user, author=author)
+            for user in users
+            for author in rng.sample(users, min(
+                SUBSCRIPTIONS_PER_USER, len(users)))
+            if author != user
+        ], batch_size=BACKUP_BATCH_SIZE, ignore_conflicts=True)
+        pending().tables(User, Tag, Ingredient, Recipe)
+        call_command('rebuild_tag_masks', stdout=self.stdout)
+        call_command('refresh_scores', full=True, stdout=self.stdout)
+        call_command('build_recommendations', full=True, workers=1,
+                     stdout=self.stdout)
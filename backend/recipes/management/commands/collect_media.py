@@ -0,0 +1,110 @@
+import os
+from datetime import timedelta
+from itertools import islice
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.constants import MEDIA_GC_BATCH_SIZE, MEDIA_GC_GRACE_SECONDS
+from recipes.models import MediaFile
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаляет файлы медиа, на которые не ссылается '
+            'ни один рецепт или пользователь')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recount', action='store_true',
+            help='Пересчитать ссылки на файлы по рецептам и пользователям')
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Также найти на диске файлы, не учтённые в базе')
+        parser.add_argument(
+            '--grace', type=int, default=MEDIA_GC_GRACE_SECONDS,
+            help='Не удалять файлы, изменённые за последние N секунд')
+        parser.add_argument(
+            '--batch-size', type=int, default=MEDIA_GC_BATCH_SIZE,
+            help='Количество файлов в одной пачке')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать количество файлов для удаления')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            self.stdout.write(
+                f'Учтено файлов: {MediaFile.objects.recount()}')
+        self.cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        self.dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        removed = 0
+        for batch in batches(self.unreferenced(), self.batch_size):
+            removed += self.collect(batch)
+        if options['scan']:
+            for batch in batches(self.untracked(), self.batch_size):
+                known = set(MediaFile.objects.filter(
+                    name__in=batch).values_list('name', flat=True))
+                removed += self.collect(
+                    [name for name in batch if name not in known])
+        verb = 'Будет удалено' if self.dry_run else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{verb} файлов: {removed}'))
+
+    def unreferenced(self):
+        last = ''
+        while True:
+            names = list(MediaFile.objects.filter(
+                name__gt=last, ref_count__lte=0, updated_at__lt=self.cutoff
+            ).order_by('name').values_list(
+                'name', flat=True)[:self.batch_size])
+            if not names:
+                return
+            yield from names
+            last = names[-1]
+
+    def untracked(self):
+        location = default_storage.location
+        cutoff = self.cutoff.timestamp()
+        for root, _, files in os.walk(location):
+            for file in files:
+                path = os.path.join(root, file)
+                if os.path.getmtime(path) < cutoff:
+                    yield os.path.relpath(path, location).replace(os.sep, '/')
+
+    def expired(self, name):
+        try:
+            return default_storage.get_modified_time(name) < self.cutoff
+        except FileNotFoundError:
+            return True
+
+    def collect(self, names):
+        names = set(names) - MediaFile.objects.referenced(names)
+        names = {name for name in names if self.expired(name)}
+        if self.dry_run or not names:
+            return len(names)
+        with transaction.atomic():
+            names -= {
+                name for name, ref_count, updated_at
+                in MediaFile.objects.select_for_update().filter(
+                    name__in=names
+                ).values_list('name', 'ref_count', 'updated_at')
+                if ref_count > 0 or updated_at >= self.cutoff
+            }
+            names -= MediaFile.objects.referenced(names)
+            removed = []
+            for name in sorted(names):
+                if self.expired(name):
+                    default_storage.delete(name)
+                    removed.append(name)
+            MediaFile.objects.filter(name__in=removed).delete()
+        return len(removed)
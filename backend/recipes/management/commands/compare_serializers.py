@@ -0,0 +1,57 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.flat_serializers import (IngredientFlatSerializer,
+                                  RecipeFlatSerializer,
+                                  SubscriptionFlatSerializer)
+from api.renderers import FastJSONRenderer
+from api.serializers import (IngredientSerializer, RecipeSerializer,
+                             SubscriptionSerializer)
+from recipes.models import Ingredient, Recipe, User
+
+
+class Command(BaseCommand):
+    help = ('Сверяет ответы быстрых сериализаторов списков '
+            'с ответами сериализаторов DRF')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5,
+                            help='Количество пользователей для проверки')
+        parser.add_argument('--recipes-limit', default='',
+                            help='Значение параметра recipes_limit')
+
+    def handle(self, *args, **options):
+        users = [AnonymousUser()] + list(
+            User.objects.order_by('id')[:options['users']])
+        renderer = FastJSONRenderer()
+        mismatches = 0
+        for user in users:
+            request = Request(RequestFactory().get(
+                '/', {'recipes_limit': options['recipes_limit']}))
+            request.user = user
+            context = {'request': request}
+            checks = [
+                (RecipeSerializer, RecipeFlatSerializer, Recipe.objects),
+                (IngredientSerializer, IngredientFlatSerializer,
+                 Ingredient.objects),
+            ]
+            if user.is_authenticated:
+                checks.append((SubscriptionSerializer,
+                               SubscriptionFlatSerializer,
+                               user.follower.order_by('id')))
+            for serializer_class, flat_class, queryset in checks:
+                queryset = queryset.all()
+                expected = renderer.render(serializer_class(
+                    queryset, many=True, context=context).data)
+                flat = flat_class(context)
+                actual = renderer.render(
+                    flat.serialize(flat.project(queryset)))
+                if expected != actual:
+                    mismatches += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'{flat_class.__name__} ({user}): ответы различаются'))
+        if mismatches:
+            raise CommandError(f'Найдено расхождений: {mismatches}')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают'))
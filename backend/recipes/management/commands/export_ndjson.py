@@ -0,0 +1,44 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.backup import SECTIONS, export_rows
+from recipes.constants import BACKUP_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, рецепты и связанные данные '
+            'в потоковый NDJSON файл')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к файлу выгрузки или "-" для stdout')
+        parser.add_argument(
+            '--images', choices=('ref', 'base64'), default='ref',
+            help='Сохранять изображения ссылками или встраивать в base64')
+        parser.add_argument(
+            '--chunk-size', type=int, default=BACKUP_CHUNK_SIZE,
+            help='Количество строк, читаемых из курсора за раз')
+
+    def handle(self, *args, **options):
+        inline = options['images'] == 'base64'
+        started = time.monotonic()
+        total = 0
+        stream = (sys.stdout if options['path'] == '-'
+                  else open(options['path'], 'w', encoding='utf-8'))
+        try:
+            for section in SECTIONS:
+                count = 0
+                for line in export_rows(section, options['chunk_size'],
+                                        inline):
+                    stream.write(line + '\n')
+                    count += 1
+                total += count
+                self.stderr.write(f'{section.label}: {count}')
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено строк: {total} за {elapsed:.1f} с'))
@@ -4,6 +4,7 @@ import os
 from django.conf import settings
 from django.core.management.base import BaseCommand
 
+from recipes.changes import pending
 from recipes.models import Ingredient
 
 
@@ -35,6 +36,7 @@ class Command(BaseCommand):
                             f'Ошибка при обработке строки {row}: {e}'))
                         continue
             Ingredient.objects.bulk_create(ingredients)
+            pending().tables(Ingredient)
             self.stdout.write(self.style.SUCCESS(
                 'Данные успешно импортированы'))
         except FileNotFoundError:
@@ -0,0 +1,101 @@
+import time
+from collections import defaultdict
+from itertools import groupby, islice
+from multiprocessing import Pool
+
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipes.backup import (MAPPED_LABELS, SECTIONS, init_worker,
+                            load_batch, read_batches)
+from recipes.changes import pending
+from recipes.constants import BACKUP_BATCH_SIZE
+from recipes.jobs import enqueue
+from recipes.models import (ChangeLogEntry, MediaFile, Recipe,
+                            RecipeSnapshot, TableVersion)
+
+
+class Command(BaseCommand):
+    help = ('Загружает NDJSON выгрузку, созданную export_ndjson, '
+            'с переназначением идентификаторов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу выгрузки')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Количество параллельных процессов')
+        parser.add_argument(
+            '--batch-size', type=int, default=BACKUP_BATCH_SIZE,
+            help='Количество строк в одной вставке')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        maps = defaultdict(dict)
+        changes = defaultdict(set)
+        started = time.monotonic()
+        total = 0
+        with open(options['path'], encoding='utf-8') as stream:
+            for label, group in groupby(
+                    read_batches(stream, options['batch_size']),
+                    key=lambda item: item[0]):
+                section_started = time.monotonic()
+                read = written = 0
+                for mapping, rows, created, logged in self.load(
+                        group, maps, workers):
+                    if label in MAPPED_LABELS:
+                        maps[label].update(mapping)
+                    for model, object_id, user_id in logged:
+                        changes[model, user_id].add(object_id)
+                    read += rows
+                    written += created
+                total += read
+                elapsed = time.monotonic() - section_started
+                self.stdout.write(
+                    f'{label}: прочитано {read}, записано {written}, '
+                    f'{read / elapsed if elapsed else read:.0f} строк/с')
+        call_command('rebuild_tag_masks', stdout=self.stdout)
+        MediaFile.objects.recount()
+        self.record_changes(changes, options['batch_size'])
+        enqueue('recipes.refresh_scores', dedup_key='recipes.refresh_scores')
+        enqueue('recipes.build_recommendations',
+                dedup_key='recipes.build_recommendations')
+        enqueue('recipes.rebuild_snapshots',
+                dedup_key='recipes.rebuild_snapshots')
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} за {elapsed:.1f} с, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с'))
+
+    def record_changes(self, changes, batch_size):
+        recipe_ids = sorted(changes.get((Recipe._meta.label_lower, None), ()))
+        for start in range(0, len(recipe_ids), batch_size):
+            RecipeSnapshot.objects.invalidate(
+                recipe_ids[start:start + batch_size])
+        for (label, user_id), object_ids in changes.items():
+            object_ids = sorted(object_ids)
+            for start in range(0, len(object_ids), batch_size):
+                ChangeLogEntry.objects.record(
+                    apps.get_model(label),
+                    object_ids[start:start + batch_size],
+                    ChangeLogEntry.UPSERT, user_id)
+        changes_pending = pending()
+        changes_pending.tables(*(section.model for section in SECTIONS))
+        changes_pending.bump(*(
+            TableVersion.key_for(apps.get_model(label), user_id)
+            for label, user_id in changes if user_id is not None))
+
+    def load(self, batches, maps, workers):
+        if workers <= 1:
+            init_worker(maps)
+            yield from map(load_batch, batches)
+            return
+        connections.close_all()
+        with Pool(workers, initializer=init_worker,
+                  initargs=(dict(maps),)) as pool:
+            while True:
+                window = list(islice(batches, workers * 2))
+                if not window:
+                    break
+                yield from pool.imap_unordered(load_batch, window)
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.constants import SYNC_PRUNE_BATCH_SIZE, SYNC_RETENTION_DAYS
+from recipes.models import ChangeLogEntry
+
+
+class Command(BaseCommand):
+    help = ('Удаляет записи журнала изменений старше срока хранения '
+            'токенов синхронизации')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=SYNC_RETENTION_DAYS,
+            help='Срок хранения записей в днях')
+        parser.add_argument(
+            '--batch-size', type=int, default=SYNC_PRUNE_BATCH_SIZE,
+            help='Количество записей, удаляемых за один запрос')
+
+    def handle(self, *args, **options):
+        entries = ChangeLogEntry.objects.filter(
+            created_at__lt=timezone.now() - timedelta(days=options['days']))
+        deleted = 0
+        while True:
+            ids = list(entries.order_by('created_at').values_list(
+                'id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += ChangeLogEntry.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей журнала изменений: {deleted}'))
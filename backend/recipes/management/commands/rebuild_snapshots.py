@@ -0,0 +1,51 @@
+import os
+from multiprocessing import Pool
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+
+from api.snapshots import rebuild_snapshots
+from recipes.constants import SNAPSHOT_BATCH_SIZE, SNAPSHOT_FORMAT
+from recipes.models import Recipe
+
+
+def rebuild_batch(recipe_ids):
+    return len(rebuild_snapshots(recipe_ids))
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает готовые представления рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Собрать только отсутствующие и устаревшие представления')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество параллельных процессов')
+        parser.add_argument(
+            '--batch-size', type=int, default=SNAPSHOT_BATCH_SIZE,
+            help='Количество рецептов в одной пачке')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('id')
+        if options['missing']:
+            recipes = recipes.filter(
+                Q(snapshot__isnull=True) | Q(snapshot__payload__isnull=True)
+                | Q(snapshot__format__lt=SNAPSHOT_FORMAT))
+        recipe_ids = list(recipes.values_list('id', flat=True))
+        chunks = batches(recipe_ids, options['batch_size'])
+        if options['workers'] > 1:
+            connections.close_all()
+            with Pool(options['workers']) as pool:
+                rebuilt = sum(pool.imap_unordered(rebuild_batch, chunks))
+        else:
+            rebuilt = sum(map(rebuild_batch, chunks))
+        self.stdout.write(self.style.SUCCESS(
+            f'Собрано представлений рецептов: {rebuilt}'))
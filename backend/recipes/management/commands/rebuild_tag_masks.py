@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from recipes.changes import pending
+from recipes.models import Recipe, Tag
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает битовые маски тегов у всех рецептов'
+
+    @transaction.atomic
+    def handle(self, *args, **kwargs):
+        Recipe.objects.update(tag_mask=0)
+        for tag_id in Tag.objects.values_list('id', flat=True):
+            bit = Tag.bit_for(tag_id)
+            if bit:
+                Recipe.objects.filter(tags=tag_id).update(
+                    tag_mask=F('tag_mask') + bit)
+        pending().tables(Recipe)
+        self.stdout.write(self.style.SUCCESS('Маски тегов пересчитаны'))
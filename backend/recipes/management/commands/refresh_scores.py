@@ -0,0 +1,113 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from recipes.constants import (CART_SCORE_WEIGHT, FAVORITE_SCORE_WEIGHT,
+                               SCORE_BATCH_SIZE, TRENDING_HALF_LIFE_HOURS,
+                               TRENDING_REBASE_HALF_LIVES,
+                               TRENDING_WINDOW_DAYS)
+from recipes.models import (ChangeLogEntry, Favorite, Recipe, RecipeScore,
+                            ShoppingCart, TableVersion)
+
+SCORE_SOURCES = ((Favorite, FAVORITE_SCORE_WEIGHT),
+                 (ShoppingCart, CART_SCORE_WEIGHT))
+HALF_LIFE = timedelta(hours=TRENDING_HALF_LIFE_HOURS)
+EPOCH_KEY = f'{TableVersion.key_for(RecipeScore)}.epoch'
+
+
+def growth(moment, epoch):
+    return 2 ** ((moment - epoch) / HALF_LIFE)
+
+
+def batches(items, size=SCORE_BATCH_SIZE):
+    items = sorted(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинги популярности и трендов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать все рейтинги заново, а не только изменения')
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        key = TableVersion.key_for(RecipeScore)
+        runs = TableVersion.objects.snapshot([key, EPOCH_KEY])
+        last_run = runs.get(key, (None, None))[1]
+        epoch = runs.get(EPOCH_KEY, (None, None))[1]
+        with transaction.atomic():
+            if options['full'] or last_run is None or epoch is None:
+                epoch = started
+                TableVersion.objects.bump(EPOCH_KEY, at=epoch)
+                recipe_ids = Recipe.objects.values_list('id', flat=True)
+            else:
+                epoch = self.rebase(epoch, started)
+                recipe_ids = self.changed_recipes(last_run, started)
+            count = 0
+            for batch in batches(recipe_ids):
+                count += self.rescore(batch, started, epoch)
+            TableVersion.objects.bump(key, at=started)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рейтингов: {count}'))
+
+    def rebase(self, epoch, started):
+        shift = (started - epoch) // HALF_LIFE
+        if shift < TRENDING_REBASE_HALF_LIVES:
+            return epoch
+        RecipeScore.objects.update(trending=F('trending') * 0.5 ** shift)
+        epoch += shift * HALF_LIFE
+        TableVersion.objects.bump(EPOCH_KEY, at=epoch)
+        return epoch
+
+    def changed_recipes(self, last_run, started):
+        changed = set(Recipe.objects.filter(
+            score__isnull=True).values_list('id', flat=True))
+        for model, _ in SCORE_SOURCES:
+            changed.update(model.objects.filter(
+                created_at__gt=last_run, created_at__lte=started
+            ).values_list('recipe', flat=True).distinct())
+        changed.update(ChangeLogEntry.objects.filter(
+            model__in=[model._meta.label_lower for model, _ in SCORE_SOURCES],
+            action=ChangeLogEntry.DELETE,
+            created_at__gt=last_run, created_at__lte=started
+        ).values_list('object_id', flat=True).distinct())
+        return changed
+
+    def rescore(self, recipe_ids, started, epoch):
+        window_start = started - timedelta(days=TRENDING_WINDOW_DAYS)
+        popularity = defaultdict(float)
+        trending = defaultdict(float)
+        for model, weight in SCORE_SOURCES:
+            events = model.objects.filter(recipe__in=recipe_ids)
+            for recipe_id, total in events.values_list('recipe').annotate(
+                    total=Count('id')).order_by():
+                popularity[recipe_id] += weight * total
+            for recipe_id, hour, total in events.filter(
+                created_at__gt=window_start, created_at__lte=started
+            ).annotate(
+                hour=TruncHour('created_at')
+            ).values_list('recipe', 'hour').annotate(
+                    total=Count('id')).order_by():
+                trending[recipe_id] += weight * total * growth(hour, epoch)
+        scores = RecipeScore.objects.bulk_create(
+            [
+                RecipeScore(recipe_id=recipe_id, author_id=author_id,
+                            popularity=popularity[recipe_id],
+                            trending=trending[recipe_id])
+                for recipe_id, author_id in Recipe.objects.filter(
+                    id__in=recipe_ids).values_list('id', 'author')
+            ],
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['author', 'popularity', 'trending'],
+        )
+        return len(scores)
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+
+import django
+from django.core.management.base import BaseCommand
+
+from recipes.constants import JOB_HEARTBEAT_SECONDS, JOB_POLL_SECONDS
+from recipes.jobs import execute, schedule_periodic
+from recipes.models import Job
+
+
+def make_executor(pool, workers):
+    if pool == 'process':
+        return ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup)
+    return ThreadPoolExecutor(workers, thread_name_prefix='job')
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Количество одновременно выполняемых задач')
+        parser.add_argument(
+            '--pool', choices=('thread', 'process'), default='thread',
+            help='Пул потоков или процессов для выполнения задач')
+        parser.add_argument(
+            '--poll-interval', type=float, default=JOB_POLL_SECONDS,
+            help='Пауза между опросами пустой очереди в секундах')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и завершиться')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        completed = 0
+        running = {}
+        heartbeat = 0
+        with make_executor(options['pool'], workers) as executor:
+            try:
+                while True:
+                    if time.monotonic() - heartbeat >= JOB_HEARTBEAT_SECONDS:
+                        Job.objects.heartbeat(running.values())
+                        schedule_periodic()
+                        heartbeat = time.monotonic()
+                    free = workers - len(running)
+                    if free:
+                        running.update(
+                            (executor.submit(execute, job_id), job_id)
+                            for job_id in Job.objects.claim(free))
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+                    done, _ = wait(
+                        running, timeout=options['poll_interval'],
+                        return_when=FIRST_COMPLETED)
+                    completed += len(done)
+                    for future in done:
+                        del running[future]
+                        if future.exception() is not None:
+                            self.stderr.write(
+                                f'Сбой исполнителя: {future.exception()!r}')
+            except KeyboardInterrupt:
+                self.stdout.write('Остановка: ожидание текущих задач')
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано задач: {completed + len(running)}'))
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+STARTUP_CODE = '''
+import time
+started = time.perf_counter()
+import django
+django.setup()
+import foodgram_backend.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+print('setup', time.perf_counter() - started)
+if {warm_up}:
+    from foodgram_backend.startup import warm_up
+    started = time.perf_counter()
+    warm_up()
+    print('warm_up', time.perf_counter() - started)
+'''
+
+
+def parse_importtime(output):
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.setdefault(name.strip(), (int(cumulative_us), int(self_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = ('Показывает самые медленные импорты при запуске приложения '
+            'и вклад каждого приложения из INSTALLED_APPS')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Количество самых медленных модулей в отчёте')
+        parser.add_argument(
+            '--sort', choices=('cumulative', 'self'), default='cumulative',
+            help='Сортировать по суммарному или собственному времени')
+        parser.add_argument(
+            '--warm-up', action='store_true',
+            help='Также измерить время прогрева кэшей')
+
+    def handle(self, *args, **options):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             STARTUP_CODE.format(warm_up=options['warm_up'])],
+            capture_output=True, text=True, cwd=settings.BASE_DIR,
+            env={**os.environ, 'DEFER_WORKER_STARTUP': '1'})
+        if result.returncode:
+            raise CommandError(result.stderr.splitlines()[-1])
+        imports = parse_importtime(result.stderr)
+        column = 0 if options['sort'] == 'cumulative' else 1
+        self.stdout.write('Суммарно, мс  Собственное, мс  Модуль')
+        for name, times in sorted(imports.items(), key=lambda item: (
+                -item[1][column]))[:options['limit']]:
+            self.stdout.write(
+                f'{times[0] / 1000:12.1f}  {times[1] / 1000:15.1f}  {name}')
+        self.stdout.write('\nСобственное время пакетов приложений, мс:')
+        dev_apps = getattr(settings, 'DEV_APPS', [])
+        app_names = [config.name for config in apps.get_app_configs()]
+        for app in dict.fromkeys(app_names + dev_apps):
+            total = sum(times[1] for name, times in imports.items()
+                        if name == app or name.startswith(f'{app}.'))
+            marker = ' (только для разработки)' if app in dev_apps else ''
+            self.stdout.write(f'{total / 1000:12.1f}  {app}{marker}')
+        for line in result.stdout.splitlines():
+            stage, seconds = line.split()
+            self.stdout.write(self.style.SUCCESS(
+                f'{stage}: {float(seconds) * 1000:.0f} мс'))
@@ -0,0 +1,144 @@
+import random
+import threading
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Recipe, ShoppingCart, User
+
+SEED_PREFIX = 'stress-toggle'
+ACTIONS = {'favorite': Favorite, 'shopping_cart': ShoppingCart}
+ALLOWED_STATUSES = {201, 204, 400}
+
+
+class Command(BaseCommand):
+    help = ('Параллельно переключает избранное и корзину и проверяет, '
+            'что каждый запрос выполняет одну запись и отвечает 201/204/400 '
+            '(только для отдельной проверочной базы)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Количество параллельных потоков')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Количество запросов в каждом потоке')
+        parser.add_argument(
+            '--users', type=int, default=2,
+            help='Количество пользователей, общих для всех потоков')
+        parser.add_argument(
+            '--recipes', type=int, default=2,
+            help='Количество рецептов, общих для всех потоков')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка доступна только в PostgreSQL')
+        self.users, self.recipes = self.seed(
+            options['users'], options['recipes'])
+        self.views = {
+            name: RecipeViewSet.as_view(
+                {'post': name, 'delete': name},
+                **{**getattr(RecipeViewSet, name).kwargs,
+                   'throttle_classes': ()})
+            for name in ACTIONS
+        }
+        self.requests = options['requests']
+        self.results = []
+        self.lock = threading.Lock()
+        barrier = threading.Barrier(options['threads'])
+        threads = [
+            threading.Thread(target=self.worker, args=(number, barrier))
+            for number in range(options['threads'])
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            errors = self.check()
+        finally:
+            User.objects.filter(username__startswith=SEED_PREFIX).delete()
+        statuses = Counter(str(result[3]) for result in self.results)
+        self.stdout.write(
+            f'Запросов: {len(self.results)}, ответы: ' + ', '.join(
+                f'{status}: {count}'
+                for status, count in sorted(statuses.items())))
+        for error in errors[:20]:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f'Найдено нарушений: {len(errors)}')
+        self.stdout.write(self.style.SUCCESS(
+            'Все переключения выполнены одним запросом без ошибок'))
+
+    def seed(self, users, recipes):
+        User.objects.filter(username__startswith=SEED_PREFIX).delete()
+        created = [
+            User.objects.create(
+                email=f'{SEED_PREFIX}-{number}@example.com',
+                username=f'{SEED_PREFIX}-{number}',
+                first_name='Нагрузка', last_name='Проверка', password='!')
+            for number in range(users + 1)
+        ]
+        author = created.pop()
+        return created, [
+            Recipe.objects.create(
+                author=author, name=f'{SEED_PREFIX}-{number}',
+                text=SEED_PREFIX, cooking_time=1,
+                image=f'recipes/images/{SEED_PREFIX}.png')
+            for number in range(recipes)
+        ]
+
+    def worker(self, number, barrier):
+        rng = random.Random(number)
+        factory = APIRequestFactory()
+        results = []
+        barrier.wait()
+        try:
+            for _ in range(self.requests):
+                user = rng.choice(self.users)
+                recipe = rng.choice(self.recipes)
+                name = rng.choice(list(ACTIONS))
+                method = rng.choice(('post', 'delete'))
+                request = getattr(factory, method)(
+                    f'/api/recipes/{recipe.pk}/{name}/')
+                force_authenticate(request, user)
+                table = f'"{ACTIONS[name]._meta.db_table}"'
+                with CaptureQueriesContext(connection) as context:
+                    try:
+                        status = self.views[name](
+                            request, pk=recipe.pk).status_code
+                    except Exception as error:
+                        status = repr(error)
+                statements = sum(table in query['sql']
+                                 for query in context.captured_queries)
+                results.append((user.pk, recipe.pk, name, status, statements))
+        finally:
+            connection.close()
+        with self.lock:
+            self.results += results
+
+    def check(self):
+        errors = []
+        balance = Counter()
+        for user_id, recipe_id, name, status, statements in self.results:
+            if status not in ALLOWED_STATUSES:
+                errors.append(f'{name} {recipe_id} от {user_id}: {status}')
+            if statements != 1:
+                errors.append(f'{name} {recipe_id} от {user_id}: '
+                              f'запросов к таблице {statements}')
+            balance[user_id, recipe_id, name] += {201: 1, 204: -1}.get(
+                status, 0)
+        for name, model in ACTIONS.items():
+            for user in self.users:
+                for recipe in self.recipes:
+                    exists = model.objects.filter(
+                        user=user, recipe=recipe).exists()
+                    if balance[user.pk, recipe.pk, name] != exists:
+                        errors.append(
+                            f'{name} {recipe.pk} от {user.pk}: '
+                            f'ответы не совпадают с состоянием базы')
+        return errors
@@ -1,18 +1,45 @@
+from collections import Counter
+from datetime import timedelta
+
 import shortuuid
 
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
-from django.db import models
-
-from .constants import (MAX_LENGTH_EMAIL, MAX_LENGTH_FIRSTNAME,
-                        MAX_LENGTH_LASTNAME, MAX_LENGTH_NAME_RECIPE,
+from django.contrib.postgres.indexes import OpClass
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import Upper
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from .constants import (JOB_MAX_ATTEMPTS, JOB_TIMEOUT_SECONDS,
+                        MAX_LENGTH_EMAIL, MAX_LENGTH_FIRSTNAME,
+                        MAX_LENGTH_JOB_KEY, MAX_LENGTH_JOB_NAME,
+                        MAX_LENGTH_JOB_STATUS, MAX_LENGTH_LASTNAME,
+                        MAX_LENGTH_MEAL_PLAN_NAME, MAX_LENGTH_MEDIA_NAME,
+                        MAX_LENGTH_NAME_RECIPE,
                         MAX_LENGTH_NAME_TAG, MAX_LENGTH_SLUG,
-                        MAX_LENGTH_UNIT, MAX_LENGTH_USERNAME,
-                        MIN_VALUE_ING, MIN_VALUE_TIME, ORIGINAL_URL,
-                        SHORT_URL, SHORT_URL_LIMIT)
+                        MAX_LENGTH_CHANGE_ACTION, MAX_LENGTH_UNIT,
+                        MAX_LENGTH_USERNAME, MAX_LENGTH_VERSION_KEY,
+                        MIN_VALUE_ING, MIN_VALUE_SERVINGS, MIN_VALUE_TIME,
+                        ORIGINAL_URL,
+                        SHORT_URL, SHORT_URL_LIMIT, SNAPSHOT_FORMAT,
+                        TAG_MASK_BITS)
 from .validators import name_validator, unicode_validator
 
 
+class PatternIndex(models.Index):
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().create_sql(model, schema_editor, using, **kwargs)
+        return models.Index(
+            *(OpClass(expression, name='text_pattern_ops')
+              for expression in self.expressions),
+            name=self.name
+        ).create_sql(model, schema_editor, using, **kwargs)
+
+
 class User(AbstractUser):
     email = models.EmailField(max_length=MAX_LENGTH_EMAIL, unique=True)
     first_name = models.CharField(max_length=MAX_LENGTH_FIRSTNAME,
@@ -21,7 +48,8 @@ class User(AbstractUser):
                                  validators=[name_validator])
     username = models.CharField(max_length=MAX_LENGTH_USERNAME, unique=True,
                                 validators=[unicode_validator])
-    avatar = models.ImageField(upload_to='users/', null=True, blank=True)
+    avatar = models.ImageField(upload_to='users/', null=True, blank=True,
+                               db_index=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
@@ -65,6 +93,9 @@ class Ingredient(BaseModel):
 
     class Meta:
         default_related_name = 'ingredients'
+        indexes = [
+            PatternIndex(Upper('name'), name='ingredient_name_prefix_idx'),
+        ]
 
 
 class Tag(BaseModel):
@@ -73,10 +104,23 @@ class Tag(BaseModel):
     class Meta:
         default_related_name = 'tags'
 
+    @staticmethod
+    def bit_for(tag_id):
+        if 0 < tag_id <= TAG_MASK_BITS:
+            return 1 << (tag_id - 1)
+        return 0
+
+    @classmethod
+    def mask_for(cls, tag_ids):
+        mask = 0
+        for tag_id in tag_ids:
+            mask |= cls.bit_for(tag_id)
+        return mask
+
 
 class Recipe(models.Model):
     tags = models.ManyToManyField(Tag, related_name='recipes')
-    image = models.ImageField(upload_to='recipes/images/')
+    image = models.ImageField(upload_to='recipes/images/', db_index=True)
     name = models.CharField(max_length=MAX_LENGTH_NAME_RECIPE,
                             validators=[name_validator])
     text = models.TextField()
@@ -89,14 +133,32 @@ class Recipe(models.Model):
                 message='Время приготовления должно быть больше 0'),
         )
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    tag_mask = models.BigIntegerField(default=0)
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+            models.Index(fields=['updated_at'],
+                         name='recipe_updated_at_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class IngredientInRecipeQuerySet(models.QuerySet):
+
+    def totals(self, weight=None):
+        amount = F('amount') if weight is None else F('amount') * weight
+        return self.values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
+        ).annotate(amount=Sum(amount)).order_by()
+
+
 class IngredientInRecipe(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
                                related_name='ingredientinrecipe')
@@ -109,6 +171,8 @@ class IngredientInRecipe(models.Model):
         )
     )
 
+    objects = IngredientInRecipeQuerySet.as_manager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -117,16 +181,60 @@ class IngredientInRecipe(models.Model):
         ]
 
 
+class UserRecipeRelationQuerySet(models.QuerySet):
+
+    def _execute(self, sql, params):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(sql.format(table=table), params)
+            return cursor.rowcount
+
+    def add(self, user, recipe):
+        added = self._execute(
+            'INSERT INTO {table} (user_id, recipe_id, created_at) '
+            'VALUES (%s, %s, %s) ON CONFLICT (user_id, recipe_id) DO NOTHING',
+            [user.pk, recipe.pk, timezone.now()]
+        ) == 1
+        if added:
+            instance = self.model(user=user, recipe=recipe)
+            post_save.send(sender=self.model, instance=instance,
+                           created=True, update_fields=None, raw=False,
+                           using=self.db)
+        return added
+
+    def remove(self, user, recipe):
+        removed = self._execute(
+            'DELETE FROM {table} WHERE user_id = %s AND recipe_id = %s',
+            [user.pk, recipe.pk]
+        ) == 1
+        if removed:
+            instance = self.model(user=user, recipe=recipe)
+            post_delete.send(sender=self.model, instance=instance,
+                             using=self.db, origin=instance)
+        return removed
+
+
 class UserRecipeRelation(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             db_index=False)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               db_index=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = UserRecipeRelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
+        indexes = [
+            models.Index(fields=['recipe', 'created_at'],
+                         name='%(class)s_recipe_idx'),
+            models.Index(fields=['created_at'],
+                         name='%(class)s_created_idx'),
+        ]
 
 
 class Favorite(UserRecipeRelation):
-    class Meta:
+    class Meta(UserRecipeRelation.Meta):
         default_related_name = 'favorited_by'
         constraints = (
             models.UniqueConstraint(
@@ -138,7 +246,7 @@ class Favorite(UserRecipeRelation):
 
 class ShoppingCart(UserRecipeRelation):
 
-    class Meta:
+    class Meta(UserRecipeRelation.Meta):
         default_related_name = 'in_shoppingcart'
         constraints = (
             models.UniqueConstraint(
@@ -158,5 +266,415 @@ class ShortLink(models.Model):
             self.short_link = link
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['original_url'],
+                         name='shortlink_original_url_idx'),
+        ]
+
     def __str__(self):
         return self.short_link
+
+
+class RecipeScore(models.Model):
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='score')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+', db_index=False)
+    popularity = models.FloatField(default=0)
+    trending = models.FloatField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-popularity', '-recipe'],
+                         name='score_popularity_idx'),
+            models.Index(fields=['-trending', '-recipe'],
+                         name='score_trending_idx'),
+            models.Index(fields=['author', '-popularity', '-recipe'],
+                         name='score_author_popularity_idx'),
+            models.Index(fields=['author', '-trending', '-recipe'],
+                         name='score_author_trending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popularity}/{self.trending}'
+
+
+class RecipeNeighbor(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='neighbors')
+    neighbor = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                                 related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'neighbor'], name='neighbor_unique'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='neighbor_recipe_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.neighbor_id}: {self.score}'
+
+
+class TableVersionQuerySet(models.QuerySet):
+
+    def bump(self, *keys, at=None):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} (name, version, updated_at) '
+            f'VALUES (%s, 1, %s) ON CONFLICT (name) DO UPDATE SET '
+            f'version = {table}.version + 1, '
+            f'updated_at = EXCLUDED.updated_at'
+        )
+
+        def apply():
+            now = at or timezone.now()
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, [(key, now) for key in keys])
+
+        transaction.on_commit(apply)
+
+    def snapshot(self, keys):
+        return {
+            name: (version, updated_at)
+            for name, version, updated_at in self.filter(
+                name__in=keys).values_list('name', 'version', 'updated_at')
+        }
+
+
+class TableVersion(models.Model):
+    name = models.CharField(max_length=MAX_LENGTH_VERSION_KEY, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = TableVersionQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+    @staticmethod
+    def key_for(model, user_id=None):
+        label = model._meta.label_lower
+        if user_id is None:
+            return label
+        return f'{label}:{user_id}'
+
+
+class ChangeLogEntryQuerySet(models.QuerySet):
+
+    def record(self, model, object_ids, action, user_id=None):
+        entries = [
+            self.model(model=model._meta.label_lower, object_id=object_id,
+                       action=action, user_id=user_id)
+            for object_id in object_ids
+        ]
+        transaction.on_commit(lambda: self.bulk_create(entries))
+
+
+class ChangeLogEntry(models.Model):
+    UPSERT = 'upsert'
+    DELETE = 'delete'
+    ACTIONS = (
+        (UPSERT, 'Изменение'),
+        (DELETE, 'Удаление'),
+    )
+
+    model = models.CharField(max_length=MAX_LENGTH_VERSION_KEY)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=MAX_LENGTH_CHANGE_ACTION,
+                              choices=ACTIONS)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeLogEntryQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user_id', 'id'],
+                         name='changelog_user_id_idx'),
+            models.Index(fields=['created_at'],
+                         name='changelog_created_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.action} {self.model} {self.object_id}'
+
+
+class JobQuerySet(models.QuerySet):
+
+    def enqueue(self, name, payload=None, dedup_key=None, run_after=None,
+                max_attempts=JOB_MAX_ATTEMPTS):
+        job = self.model(name=name, payload=payload or {},
+                         dedup_key=dedup_key, max_attempts=max_attempts,
+                         run_after=run_after or timezone.now())
+        transaction.on_commit(
+            lambda: self.bulk_create([job], ignore_conflicts=True))
+
+    def due(self, now):
+        stale = now - timedelta(seconds=JOB_TIMEOUT_SECONDS)
+        return self.filter(
+            models.Q(status=Job.QUEUED, run_after__lte=now)
+            | models.Q(status=Job.RUNNING, heartbeat_at__lt=stale)
+        )
+
+    def claim(self, limit):
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(self.due(now).select_for_update(
+                skip_locked=True
+            ).order_by('run_after', 'id').values_list(
+                'id', 'status', 'attempts', 'max_attempts')[:limit])
+            lost = [
+                job_id for job_id, status, attempts, max_attempts in jobs
+                if status == Job.RUNNING and attempts >= max_attempts
+            ]
+            self.filter(id__in=lost).update(
+                status=Job.FAILED, finished_at=now,
+                last_error='Исполнитель перестал отвечать, '
+                           'попытки исчерпаны')
+            ids = [job_id for job_id, *_ in jobs if job_id not in lost]
+            self.filter(id__in=ids).update(
+                status=Job.RUNNING, started_at=now, heartbeat_at=now,
+                attempts=models.F('attempts') + 1)
+        return ids
+
+    def heartbeat(self, ids):
+        return self.filter(id__in=ids, status=Job.RUNNING).update(
+            heartbeat_at=timezone.now())
+
+    def pending(self):
+        return self.filter(status__in=(Job.QUEUED, Job.RUNNING))
+
+    def stats(self):
+        now = timezone.now()
+        return self.filter(status=Job.QUEUED).aggregate(
+            depth=models.Count('id'),
+            oldest=models.Min('run_after', filter=models.Q(
+                run_after__lte=now)),
+        )
+
+
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=MAX_LENGTH_JOB_NAME)
+    payload = models.JSONField(default=dict, blank=True)
+    dedup_key = models.CharField(max_length=MAX_LENGTH_JOB_KEY,
+                                 null=True, blank=True)
+    status = models.CharField(max_length=MAX_LENGTH_JOB_STATUS,
+                              choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        default=JOB_MAX_ATTEMPTS)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='job_pending_dedup_key'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['run_after', 'id'],
+                         condition=models.Q(status='queued'),
+                         name='job_queued_run_after_idx'),
+            models.Index(fields=['heartbeat_at'],
+                         condition=models.Q(status='running'),
+                         name='job_running_heartbeat_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.name} ({self.status})'
+
+
+class RecipeSnapshotQuerySet(models.QuerySet):
+
+    def invalidate(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        recipes = connection.ops.quote_name(Recipe._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} '
+            f'(recipe_id, payload, version, format, updated_at) '
+            f'SELECT id, NULL, 1, {SNAPSHOT_FORMAT}, %s FROM {recipes} '
+            f'WHERE id IN '
+            f'({", ".join(["%s"] * len(recipe_ids))}) '
+            f'ON CONFLICT (recipe_id) DO UPDATE SET payload = NULL, '
+            f'version = {table}.version + 1, updated_at = EXCLUDED.updated_at'
+        )
+
+        def apply():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [timezone.now(), *recipe_ids])
+
+        transaction.on_commit(apply)
+
+    def versions(self, recipe_ids):
+        return dict(self.filter(recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'version'))
+
+    def store(self, payloads, versions):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} '
+            f'(recipe_id, payload, version, format, updated_at) '
+            f'VALUES (%s, %s, %s, %s, %s) ON CONFLICT (recipe_id) DO UPDATE '
+            f'SET payload = EXCLUDED.payload, format = EXCLUDED.format, '
+            f'updated_at = EXCLUDED.updated_at '
+            f'WHERE {table}.version = EXCLUDED.version'
+        )
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (recipe_id, payload, versions.get(recipe_id, 0),
+                 SNAPSHOT_FORMAT, now)
+                for recipe_id, payload in payloads.items()])
+
+
+class RecipeSnapshot(models.Model):
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE,
+                                  primary_key=True, related_name='snapshot')
+    payload = models.BinaryField(null=True)
+    version = models.PositiveIntegerField(default=0)
+    format = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeSnapshotQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.updated_at}'
+
+
+MEDIA_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+class MediaFileQuerySet(models.QuerySet):
+
+    def upsert(self, counts, replace=False):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        value = ('EXCLUDED.ref_count' if replace
+                 else f'{table}.ref_count + EXCLUDED.ref_count')
+        sql = (
+            f'INSERT INTO {table} (name, ref_count, updated_at) '
+            f'VALUES (%s, %s, %s) ON CONFLICT (name) DO UPDATE SET '
+            f'ref_count = {value}, updated_at = EXCLUDED.updated_at'
+        )
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                sql, [(name, count, now) for name, count in counts.items()])
+
+    def adjust(self, deltas):
+        deltas = {name: delta for name, delta in deltas.items()
+                  if isinstance(name, str) and name and delta}
+        if deltas:
+            transaction.on_commit(lambda: self.upsert(deltas))
+
+    def recount(self):
+        counts = Counter()
+        for model, field in MEDIA_FIELDS.items():
+            counts.update(dict(model.objects.exclude(
+                **{field: ''}
+            ).filter(
+                **{f'{field}__isnull': False}
+            ).values(field).annotate(
+                total=Count('pk')
+            ).values_list(field, 'total').order_by()))
+        with transaction.atomic():
+            self.update(ref_count=0, updated_at=timezone.now())
+            self.upsert(counts, replace=True)
+        return len(counts)
+
+    def referenced(self, names):
+        found = set()
+        for model, field in MEDIA_FIELDS.items():
+            found.update(model.objects.filter(
+                **{f'{field}__in': names}).values_list(field, flat=True))
+        return found
+
+
+class MediaFile(models.Model):
+    name = models.CharField(max_length=MAX_LENGTH_MEDIA_NAME, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    objects = MediaFileQuerySet.as_manager()
+
+    def __str__(self):
+        return f'{self.name}: {self.ref_count}'
+
+
+class MealPlan(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='meal_plans')
+    name = models.CharField(max_length=MAX_LENGTH_MEAL_PLAN_NAME)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-id']
+
+    def __str__(self):
+        return f'{self.user}: {self.name}'
+
+    def ingredient_totals(self, start=None, end=None):
+        entries = Q(recipe__plan_entries__plan=self)
+        if start is not None:
+            entries &= Q(recipe__plan_entries__date__gte=start)
+        if end is not None:
+            entries &= Q(recipe__plan_entries__date__lte=end)
+        return IngredientInRecipe.objects.filter(entries).totals(
+            F('recipe__plan_entries__servings')).order_by('name')
+
+
+class MealPlanEntry(models.Model):
+    plan = models.ForeignKey(MealPlan, on_delete=models.CASCADE,
+                             related_name='entries', db_index=False)
+    date = models.DateField()
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='plan_entries')
+    servings = models.PositiveSmallIntegerField(
+        default=MIN_VALUE_SERVINGS,
+        validators=(
+            MinValueValidator(
+                MIN_VALUE_SERVINGS,
+                message='Количество порций должно быть больше 0'),
+        )
+    )
+
+    class Meta:
+        ordering = ['date', 'id']
+        indexes = [
+            models.Index(fields=['plan', 'date'],
+                         name='mealplanentry_plan_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.plan_id}: {self.date} {self.recipe_id}'
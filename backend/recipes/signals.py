@@ -0,0 +1,236 @@
+from collections import defaultdict
+
+from django.db.models import DEFERRED, F
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from . import tag_index  # noqa: F401
+from .changes import meal_plan_keys, pending
+from .models import (MEDIA_FIELDS, ChangeLogEntry, Favorite, Ingredient,
+                     IngredientInRecipe, MediaFile, Recipe, RecipeScore,
+                     ShoppingCart, ShortLink, Subscription, Tag, TableVersion,
+                     User)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=ShortLink)
+@receiver(post_delete, sender=ShortLink)
+def bump_table_version(sender, **kwargs):
+    pending().bump(TableVersion.key_for(sender))
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_version(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        pending().bump(TableVersion.key_for(Recipe))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_version(sender, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    pending().bump(TableVersion.key_for(User))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def bump_personal_version(sender, instance, **kwargs):
+    pending().bump(TableVersion.key_for(sender, instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(sender, instance, created, **kwargs):
+    if created:
+        RecipeScore.objects.bulk_create(
+            [RecipeScore(recipe=instance, author_id=instance.author_id)],
+            ignore_conflicts=True)
+
+
+def clear_tag_bit(tag_id):
+    bit = Tag.bit_for(tag_id)
+    if bit:
+        Recipe.objects.alias(
+            tag_bit=F('tag_mask').bitand(bit)
+        ).filter(tag_bit=bit).update(tag_mask=F('tag_mask') - bit)
+        pending().tables(Recipe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tag_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse and pk_set is None:
+        clear_tag_bit(instance.pk)
+        return
+    recipe_ids = pk_set if reverse else [instance.pk]
+    masks = dict.fromkeys(recipe_ids, 0)
+    for recipe_id, tag_id in sender.objects.filter(
+            recipe_id__in=masks).values_list('recipe_id', 'tag_id'):
+        masks[recipe_id] |= Tag.bit_for(tag_id)
+    recipes_by_mask = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        recipes_by_mask[mask].append(recipe_id)
+    for mask, ids in recipes_by_mask.items():
+        Recipe.objects.filter(pk__in=ids).update(tag_mask=mask)
+    if not reverse:
+        instance.tag_mask = masks[instance.pk]
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=ShortLink)
+@receiver(post_delete, sender=ShortLink)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def publish_invalidation(sender, instance, **kwargs):
+    pending().publish(TableVersion.key_for(sender), instance.pk)
+
+
+@receiver(post_delete, sender=Tag)
+def clear_deleted_tag(sender, instance, **kwargs):
+    clear_tag_bit(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def log_upsert(sender, instance, **kwargs):
+    pending().record(sender, [instance.pk], ChangeLogEntry.UPSERT)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def log_delete(sender, instance, **kwargs):
+    pending().record(sender, [instance.pk], ChangeLogEntry.DELETE)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def log_recipe_ingredients(sender, instance, **kwargs):
+    pending().record(Recipe, [instance.recipe_id], ChangeLogEntry.UPSERT)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def log_recipe_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_') or (reverse and pk_set is None):
+        return
+    pending().record(
+        Recipe, pk_set if reverse else [instance.pk], ChangeLogEntry.UPSERT)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def log_user_recipe_upsert(sender, instance, **kwargs):
+    pending().record(
+        sender, [instance.recipe_id], ChangeLogEntry.UPSERT, instance.user_id)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def log_user_recipe_delete(sender, instance, **kwargs):
+    pending().record(
+        sender, [instance.recipe_id], ChangeLogEntry.DELETE, instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_snapshot(sender, instance, **kwargs):
+    pending().snapshots([instance.pk])
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def invalidate_ingredients_snapshot(sender, instance, **kwargs):
+    pending().snapshots([instance.recipe_id])
+    pending().meal_plans([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_tags_snapshot(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    if action == 'pre_clear' and reverse:
+        pending().snapshots(instance.recipes.values_list('id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        pending().snapshots(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear':
+        pending().snapshots([instance.pk])
+
+
+def cascade_to_recipes(recipe_ids):
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    pending().snapshots(recipe_ids)
+    pending().record(Recipe, recipe_ids, ChangeLogEntry.UPSERT)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def invalidate_tag_snapshots(sender, instance, **kwargs):
+    cascade_to_recipes(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def invalidate_ingredient_snapshots(sender, instance, **kwargs):
+    cascade_to_recipes(IngredientInRecipe.objects.filter(
+        ingredient=instance).values_list('recipe_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_snapshots(sender, instance, update_fields=None,
+                                **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cascade_to_recipes(instance.recipes.values_list('id', flat=True))
+
+
+def media_name(sender, instance):
+    value = instance.__dict__.get(MEDIA_FIELDS[sender], DEFERRED)
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_media(sender, instance, **kwargs):
+    instance._stored_media = media_name(sender, instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def count_media(sender, instance, created, **kwargs):
+    name = media_name(sender, instance)
+    stored = None if created else instance._stored_media
+    if name is DEFERRED or name == stored:
+        return
+    MediaFile.objects.adjust({name: 1, stored: -1})
+    instance._stored_media = name
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def release_media(sender, instance, **kwargs):
+    MediaFile.objects.adjust({instance._stored_media: -1})
+
+
+@receiver(pre_delete, sender=Recipe)
+def invalidate_recipe_meal_plans(sender, instance, **kwargs):
+    keys = meal_plan_keys([instance.pk])
+    if keys:
+        pending().bump(*keys)
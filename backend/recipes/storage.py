@@ -0,0 +1,32 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+from .constants import MEDIA_CONTENT_DIR
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return '/'.join((MEDIA_CONTENT_DIR, digest[:2], digest[2:4],
+                         f'{digest}{extension}'))
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        temporary = super()._save(f'{name}.upload', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
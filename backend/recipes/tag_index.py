@@ -0,0 +1,30 @@
+import time
+
+from . import invalidation
+from .constants import TAG_INDEX_RELOAD_SECONDS
+from .models import TableVersion, Tag
+
+slug_ids = None
+loaded_at = 0
+
+
+def reload():
+    global slug_ids, loaded_at
+    slug_ids = dict(Tag.objects.values_list('slug', 'id'))
+    loaded_at = time.monotonic()
+
+
+def invalidate(key=None):
+    global slug_ids
+    slug_ids = None
+
+
+def tag_id(slug):
+    if slug_ids is None or (
+            slug not in slug_ids
+            and time.monotonic() - loaded_at > TAG_INDEX_RELOAD_SECONDS):
+        reload()
+    return slug_ids.get(slug)
+
+
+invalidation.register(TableVersion.key_for(Tag), invalidate)
@@ -0,0 +1,28 @@
+from django.core.management import call_command
+
+from .constants import (RECOMMENDATIONS_INTERVAL_SECONDS,
+                        SCORES_REFRESH_INTERVAL_SECONDS,
+                        SNAPSHOT_REBUILD_INTERVAL_SECONDS,
+                        SYNC_PRUNE_INTERVAL_SECONDS)
+from .jobs import task
+
+
+@task('recipes.refresh_scores', every=SCORES_REFRESH_INTERVAL_SECONDS)
+def refresh_scores():
+    call_command('refresh_scores')
+
+
+@task('recipes.build_recommendations',
+      every=RECOMMENDATIONS_INTERVAL_SECONDS)
+def build_recommendations():
+    call_command('build_recommendations', workers=1)
+
+
+@task('recipes.rebuild_snapshots', every=SNAPSHOT_REBUILD_INTERVAL_SECONDS)
+def rebuild_snapshots():
+    call_command('rebuild_snapshots', missing=True, workers=1)
+
+
+@task('recipes.prune_changelog', every=SYNC_PRUNE_INTERVAL_SECONDS)
+def prune_changelog():
+    call_command('prune_changelog')
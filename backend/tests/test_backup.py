@@ -0,0 +1,64 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, User
+
+
+class NdjsonImportTest(TransactionTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'dump.ndjson')
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Иван', last_name='Иванов', password='pass12345XX')
+        self.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        self.first = self.create_recipe('Первый суп', 10)
+        self.second = self.create_recipe('Второй суп', 20)
+
+    def create_recipe(self, text, amount):
+        recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text=text, cooking_time=30,
+            image='recipes/images/soup.png')
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.salt, amount=amount)
+        return recipe
+
+    def export(self):
+        call_command('export_ndjson', self.path, stdout=StringIO(),
+                     stderr=StringIO())
+
+    def load(self):
+        call_command('import_ndjson', self.path, stdout=StringIO())
+
+    def recipes(self):
+        return sorted(Recipe.objects.filter(author=self.author).values_list(
+            'name', 'text', 'ingredientinrecipe__amount'))
+
+    def test_reimport_keeps_same_named_recipes_apart(self):
+        self.export()
+        self.load()
+        self.assertEqual(self.recipes(), [
+            ('Суп', 'Второй суп', 20), ('Суп', 'Первый суп', 10)])
+
+    def test_restores_deleted_recipe_with_shared_name(self):
+        self.export()
+        self.first.delete()
+        self.load()
+        self.assertEqual(self.recipes(), [
+            ('Суп', 'Второй суп', 20), ('Суп', 'Первый суп', 10)])
+
+    def test_does_not_merge_into_other_recipe_with_same_name(self):
+        self.second.delete()
+        self.export()
+        self.first.delete()
+        self.create_recipe('Другой суп', 30)
+        self.load()
+        self.assertEqual(self.recipes(), [
+            ('Суп', 'Другой суп', 30), ('Суп', 'Первый суп', 10)])
@@ -0,0 +1,62 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, TableVersion, Tag, User
+
+INGREDIENTS_URL = '/api/ingredients/'
+
+
+class BulkInvalidationTest(TransactionTestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        os.mkdir(os.path.join(self.base_dir.name, 'data'))
+
+    def write_csv(self, *rows):
+        path = os.path.join(self.base_dir.name, 'data', 'ingredients.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(f'{name},{unit}\n' for name, unit in rows)
+
+    def import_csv(self, *rows):
+        self.write_csv(*rows)
+        with override_settings(BASE_DIR=self.base_dir.name):
+            call_command('import_csv', stdout=StringIO())
+
+    def test_import_csv_changes_ingredients_etag(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        before = self.client.get(INGREDIENTS_URL)
+        self.assertEqual(before.status_code, 200)
+        self.assertEqual(len(before.json()), 1)
+
+        self.import_csv(('сахар', 'г'), ('мука', 'г'))
+
+        after = self.client.get(
+            INGREDIENTS_URL, HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(
+            sorted(item['name'] for item in after.json()),
+            ['мука', 'сахар', 'соль'])
+
+    def test_rebuild_tag_masks_bumps_recipe_version(self):
+        author = User.objects.create(
+            email='author@example.com', username='author')
+        tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        recipe = Recipe.objects.create(
+            author=author, name='Каша', text='Сварить', cooking_time=10,
+            image='recipes/images/kasha.png')
+        recipe.tags.add(tag)
+        key = TableVersion.key_for(Recipe)
+        version = TableVersion.objects.get(name=key).version
+
+        call_command('rebuild_tag_masks', stdout=StringIO())
+
+        self.assertGreater(
+            TableVersion.objects.get(name=key).version, version)
@@ -0,0 +1,62 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.mixins import catalog_payloads
+from foodgram_backend.startup import warm_up
+from recipes.models import Ingredient
+
+INGREDIENTS_URL = '/api/ingredients/'
+BASE_NAMES = [f'соль {number:02}' for number in range(50)]
+
+
+class CatalogCacheTest(TransactionTestCase):
+
+    def setUp(self):
+        catalog_payloads.clear()
+        self.addCleanup(catalog_payloads.clear)
+        self.client = APIClient()
+        self.base_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.base_dir.cleanup)
+        os.mkdir(os.path.join(self.base_dir.name, 'data'))
+
+    def import_csv(self, *rows):
+        path = os.path.join(self.base_dir.name, 'data', 'ingredients.csv')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(f'{name},{unit}\n' for name, unit in rows)
+        with override_settings(BASE_DIR=self.base_dir.name):
+            call_command('import_csv', stdout=StringIO())
+
+    def get_gzip(self, **headers):
+        return self.client.get(
+            INGREDIENTS_URL, HTTP_ACCEPT_ENCODING='gzip', **headers)
+
+    def names(self, response):
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        return sorted(
+            item['name']
+            for item in json.loads(gzip.decompress(response.content)))
+
+    def test_import_csv_replaces_warmed_up_payload(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in BASE_NAMES)
+        warm_up()
+        before = self.get_gzip()
+        self.assertEqual(before.status_code, 200)
+        self.assertEqual(self.names(before), BASE_NAMES)
+
+        self.import_csv(('сахар', 'г'))
+
+        stale = self.get_gzip(HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(stale.status_code, 200)
+        self.assertNotEqual(stale['ETag'], before['ETag'])
+        self.assertEqual(self.names(stale), ['сахар', *BASE_NAMES])
+        fresh = self.get_gzip(HTTP_IF_NONE_MATCH=stale['ETag'])
+        self.assertEqual(fresh.status_code, 304)
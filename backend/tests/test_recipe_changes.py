@@ -0,0 +1,55 @@
+import base64
+
+from django.test import TransactionTestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (ChangeLogEntry, Ingredient, Recipe,
+                            RecipeSnapshot, TableVersion, Tag, User)
+
+GIF = base64.b64encode(
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04'
+    b'\x01\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D'
+    b'\x01\x00;').decode()
+
+
+class RecipeChangesTest(TransactionTestCase):
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Иван', last_name='Иванов', password='pass12345XX')
+        token = Token.objects.create(user=self.author)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.tags = [
+            Tag.objects.create(name=name, slug=slug)
+            for name, slug in (('Завтрак', 'breakfast'), ('Обед', 'lunch'))
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(10)
+        ]
+
+    def version(self):
+        return TableVersion.objects.get(
+            name=TableVersion.key_for(Recipe)).version
+
+    def test_recipe_with_ingredients_is_flushed_once(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Сварить', 'cooking_time': 30,
+            'image': f'data:image/gif;base64,{GIF}',
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [{'id': ingredient.id, 'amount': 10}
+                            for ingredient in self.ingredients],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.json()['id']
+
+        self.assertEqual(self.version(), 1)
+        self.assertEqual(list(ChangeLogEntry.objects.filter(
+            model=Recipe._meta.label_lower, object_id=recipe_id
+        ).values_list('action', flat=True)), [ChangeLogEntry.UPSERT])
+        self.assertEqual(
+            RecipeSnapshot.objects.get(recipe_id=recipe_id).version, 1)
@@ -0,0 +1,57 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.snapshots import encode, rebuild_snapshots
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe,
+                            RecipeSnapshot, User)
+
+
+class RecipeSnapshotFormatTest(TransactionTestCase):
+
+    def setUp(self):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            first_name='Иван', last_name='Иванов', password='pass12345XX')
+        Ingredient.objects.create(name='перец', measurement_unit='г')
+        self.salt = Ingredient.objects.create(name='соль',
+                                              measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Суп', text='Сварить', cooking_time=30,
+            image='recipes/images/soup.png')
+        self.line = IngredientInRecipe.objects.create(
+            recipe=self.recipe, ingredient=self.salt, amount=10)
+        self.client = APIClient()
+
+    def ingredient_ids(self):
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['ingredients']]
+
+    def store_old_format(self):
+        payload = rebuild_snapshots([self.recipe.id])[self.recipe.id]
+        payload['ingredients'][0]['id'] = self.line.id
+        RecipeSnapshot.objects.filter(recipe=self.recipe).update(
+            payload=encode(payload), format=0)
+
+    def test_expanded_ingredients_emit_ingredient_id(self):
+        self.assertEqual(self.ingredient_ids(), [self.salt.id])
+        response = self.client.get(
+            f'/api/recipes/{self.recipe.id}/?fields=ingredients')
+        self.assertEqual(
+            [item['id'] for item in response.json()['ingredients']],
+            [self.salt.id])
+
+    def test_old_format_snapshot_is_not_served(self):
+        self.store_old_format()
+        self.assertEqual(self.ingredient_ids(), [self.salt.id])
+
+    def test_rebuild_missing_replaces_old_format(self):
+        self.store_old_format()
+        call_command('rebuild_snapshots', missing=True, workers=1,
+                     stdout=StringIO())
+        self.assertEqual(RecipeSnapshot.objects.get(
+            recipe=self.recipe).format, 1)
+        self.assertEqual(self.ingredient_ids(), [self.salt.id])